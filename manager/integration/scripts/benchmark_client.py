@@ -0,0 +1,440 @@
+#!/usr/bin/env python
+#
+# Client side micro-benchmarks for the Longhorn API client in
+# manager/integration/tests/longhorn.py. No cluster is required.
+#
+# Usage:
+#   benchmark_client.py decode [--volumes N] [--file recorded.json]
+#   benchmark_client.py construct [--types N] [--file recorded-schemas.json]
+#   benchmark_client.py marshall [--disks N] [--file recorded-node.json]
+#   benchmark_client.py startup [--types N] [--file recorded-schemas.json]
+#   benchmark_client.py replay --file recording.jsonl.gz [--latency S]
+#   benchmark_client.py scale [--volumes N] [--concurrency N] [--latency S]
+#   benchmark_client.py typed [--volumes N]
+#
+# Recordings are made with pytest --api-record recording.jsonl.gz.
+#
+
+from __future__ import print_function
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import timeit
+import types
+
+from six.moves import BaseHTTPServer, socketserver
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'tests'))
+
+import fake_manager  # NOQA
+import generate_resources  # NOQA
+import longhorn  # NOQA
+
+VOLUME_ACTIONS = [
+    'activate', 'attach', 'detach', 'expand', 'engineUpgrade',
+    'pvCreate', 'pvcCreate', 'recurringUpdate', 'replicaRemove',
+    'salvage', 'snapshotBackup', 'snapshotCreate', 'snapshotDelete',
+    'snapshotGet', 'snapshotList', 'snapshotPurge', 'snapshotRevert',
+    'updateReplicaCount', 'updateDataLocality', 'cancelExpansion',
+]
+
+
+def offline_client():
+    # A client that never talks to a manager, for decoding benchmarks.
+    client = longhorn.GdapiClient.__new__(longhorn.GdapiClient)
+    client._url = 'http://localhost:9500/v1'
+    client.schema = None
+    client.resources = None
+    return client
+
+
+def fake_volume(i, base='http://localhost:9500/v1'):
+    name = 'longhorn-testvol-%06d' % i
+    url = base + '/volumes/' + name
+    replicas = []
+    for r in range(3):
+        replicas.append({
+            'name': name + '-r-%d' % r, 'hostId': 'node-%d' % r,
+            'mode': 'RW', 'running': True, 'failedAt': '',
+            'dataPath': '/var/lib/longhorn/replicas/' + name,
+            'instanceManagerName': 'instance-manager-r-%d' % r,
+            'address': '10.42.0.%d' % r, 'currentImage': 'longhorn-engine',
+        })
+    return {
+        'id': name, 'type': 'volume', 'name': name,
+        'size': '16777216', 'numberOfReplicas': 3, 'frontend': 'blockdev',
+        'state': 'attached', 'robustness': 'healthy', 'standby': False,
+        'baseImage': '', 'created': '2020-01-01T00:00:00Z',
+        'lastBackup': '', 'lastBackupAt': '', 'currentImage': 'engine',
+        'conditions': {
+            'scheduled': {'status': 'True', 'reason': '', 'message': '',
+                          'lastTransitionTime': '', 'type': 'scheduled'},
+        },
+        'kubernetesStatus': {'pvName': '', 'pvStatus': '', 'namespace': '',
+                             'pvcName': '', 'lastPVCRefAt': '',
+                             'lastPodRefAt': '', 'workloadsStatus': None},
+        'controllers': [{'name': name + '-e-0', 'hostId': 'node-0',
+                         'endpoint': '/dev/longhorn/' + name,
+                         'size': '16777216', 'lastRestoredBackup': '',
+                         'requestedBackupRestore': ''}],
+        'replicas': replicas,
+        'backupStatus': None, 'restoreStatus': None, 'purgeStatus': None,
+        'rebuildStatus': None, 'recurringJobs': None,
+        'links': {'self': url},
+        'actions': dict((a, url + '?action=' + a) for a in VOLUME_ACTIONS),
+    }
+
+
+def fake_volume_list(count):
+    return json.dumps({
+        'type': 'collection', 'resourceType': 'volume',
+        'links': {'self': 'http://localhost:9500/v1/volumes'},
+        'createTypes': {}, 'actions': {}, 'sortLinks': {},
+        'pagination': None, 'sort': None, 'filters': {},
+        'data': [fake_volume(i) for i in range(count)],
+    })
+
+
+def fake_node(disks, base='http://localhost:9500/v1'):
+    url = base + '/nodes/node-0'
+    return json.dumps({
+        'id': 'node-0', 'type': 'node', 'name': 'node-0',
+        'address': '10.42.0.1', 'allowScheduling': True, 'tags': [],
+        'region': '', 'zone': '',
+        'conditions': {
+            'Ready': {'status': 'True', 'reason': '', 'message': '',
+                      'lastTransitionTime': '', 'type': 'Ready'},
+        },
+        'disks': dict(('disk-%d' % i, {
+            'path': '/var/lib/longhorn-%d' % i, 'allowScheduling': True,
+            'evictionRequested': False, 'storageReserved': 1073741824,
+            'storageMaximum': 107374182400, 'storageAvailable': 53687091200,
+            'storageScheduled': 21474836480, 'tags': ['ssd', 'fast'],
+            'scheduledReplica': dict(
+                ('longhorn-testvol-%06d-r-%d' % (r, i), 16777216)
+                for r in range(10)),
+            'conditions': {
+                'Ready': {'status': 'True', 'reason': '', 'message': '',
+                          'lastTransitionTime': '', 'type': 'Ready'},
+                'Schedulable': {'status': 'True', 'reason': '',
+                                'message': '', 'lastTransitionTime': '',
+                                'type': 'Schedulable'},
+            },
+        }) for i in range(disks)),
+        'links': {'self': url},
+        'actions': dict((a, url + '?action=' + a)
+                        for a in ['diskUpdate', 'nodeUpdate']),
+    })
+
+
+def fake_schemas(count, base='http://localhost:9500/v1'):
+    data = []
+    for i in range(count):
+        type_name = 'resourceType%d' % i
+        data.append({
+            'id': type_name, 'type': 'schema',
+            'links': {'self': base + '/schemas/' + type_name.lower(),
+                      'collection': base + '/' + type_name.lower() + 's'},
+            'collectionMethods': ['GET', 'POST'],
+            'resourceMethods': ['GET', 'PUT', 'DELETE'],
+            'collectionFilters': {},
+            'resourceFields': dict(
+                ('field%d' % f, {'type': 'string', 'create': True,
+                                 'update': True, 'nullable': True})
+                for f in range(20)),
+            'resourceActions': dict(
+                (a, {'input': None, 'output': type_name})
+                for a in VOLUME_ACTIONS),
+        })
+    return json.dumps({'type': 'collection', 'resourceType': 'schema',
+                       'links': {'self': base + '/schemas'},
+                       'data': data})
+
+
+def serve(body):
+    # Serve body for every GET on a local port, return the server.
+    body = body.encode('utf-8')
+
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def report(args, cases):
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=args.number, repeat=args.repeat))
+        print('%-24s %8.2f ms' % (name, best / args.number * 1000))
+
+
+def bench_construct(args):
+    if args.file:
+        with open(args.file) as f:
+            text = f.read()
+    else:
+        text = fake_schemas(args.types)
+    server = serve(text)
+    url = 'http://127.0.0.1:%d/v1/schemas' % server.server_address[1]
+    transport = longhorn.HttpTransport()
+
+    def cold():
+        longhorn._schemas.clear()
+        longhorn.Client(url=url, transport=transport)
+
+    def warm():
+        longhorn.Client(url=url, transport=transport)
+
+    print('schema size: %d bytes' % len(text))
+    report(args, [('construct (no cache)', cold),
+                  ('construct (cached)', warm)])
+    server.shutdown()
+
+
+def bench_startup(args):
+    if args.file:
+        with open(args.file) as f:
+            text = f.read()
+    else:
+        text = fake_schemas(args.types)
+    server = serve(text)
+    url = 'http://127.0.0.1:%d/v1/schemas' % server.server_address[1]
+    client = longhorn.Client(url=url, transport=longhorn.HttpTransport())
+    type_name = 'volume' if 'volume' in client.schema.types \
+        else sorted(client.schema.types)[0]
+    argv = ['longhorn.py', '--url', url, 'list-' + type_name]
+
+    def all_commands():
+        longhorn._full_args(client).parse_args(argv[1:])
+
+    def invoked_command():
+        longhorn._full_args(client, argv).parse_args(argv[1:])
+
+    def startup():
+        c = longhorn._cli_client(argv)
+        longhorn._full_args(c, argv).parse_args(argv[1:])
+
+    print('%d types, %d commands' % (len(client.schema.types),
+                                     len(client.schema.commands)))
+    report(args, [('parser, all commands', all_commands),
+                  ('parser, invoked only', invoked_command),
+                  ('client + parser', startup)])
+    server.shutdown()
+
+
+def bench_replay(args):
+    recording = longhorn.TrafficRecording.load(args.file)
+    gets = [e for e in recording.entries
+            if e['method'] == 'GET' and e['status'] == 200]
+    transport = longhorn.ReplayTransport(
+        recording, latency=args.latency,
+        recorded_latency=args.recorded_latency)
+    client = longhorn.Client(url=gets[0]['url'], transport=transport,
+                             metrics=longhorn.ClientMetrics(),
+                             retry_policy=longhorn.NO_RETRY)
+
+    def replay():
+        for e in gets:
+            client._get(e['url'], e['params'])
+
+    print('%d requests recorded, %d GETs replayed' %
+          (len(recording.entries), len(gets)))
+    report(args, [('replay GETs', replay)])
+
+
+def bench_scale(args):
+    manager = fake_manager.FakeManager(latency=args.latency)
+    base = manager.start()
+    manager.add_volumes(args.volumes)
+    transport = longhorn.HttpTransport(pool_size=args.concurrency)
+    client = longhorn.Client(url=base + '/schemas', transport=transport)
+    names = ['vol-%06d' % i for i in range(min(args.volumes, 1000))]
+
+    def list_all():
+        return client.list_volume()
+
+    def iter_pages():
+        for v in client.iter_all('volume', limit=500):
+            pass
+
+    def by_id_serial():
+        for name in names[:100]:
+            client.by_id_volume(name)
+
+    async def by_ids(async_client):
+        return await async_client.gather(
+            *[async_client.by_id_volume(name) for name in names])
+
+    def by_id_async():
+        async_client = longhorn.AsyncClient(client, args.concurrency)
+        asyncio.run(by_ids(async_client))
+        async_client.close()
+
+    print('%d volumes, %d concurrent requests, %.3fs latency' %
+          (args.volumes, args.concurrency, args.latency))
+    report(args, [('list_volume', list_all),
+                  ('iter_all, 500 per page', iter_pages),
+                  ('100 x by_id, serial', by_id_serial),
+                  ('%d x by_id, async' % len(names), by_id_async)])
+    manager.stop()
+
+
+def bench_typed(args):
+    manager = fake_manager.FakeManager()
+    base = manager.start()
+    manager.add_volumes(args.volumes, state='attached')
+    transport = longhorn.HttpTransport()
+    schema_text = transport.request('GET', base + '/schemas').text
+    text = transport.request('GET', base + '/volumes').text
+    manager.stop()
+
+    resources = types.ModuleType('longhorn_resources')
+    exec(generate_resources.generate(schema_text), resources.__dict__)
+    dynamic = offline_client()
+    typed = offline_client()
+    typed.resources = resources
+
+    def read(volumes):
+        for v in volumes:
+            v.state
+            v.replicas[0].hostId
+            v.conditions.scheduled.status
+
+    assert [v.replicas[0].hostId for v in dynamic._unmarshall(text)] == \
+        [v.replicas[0].hostId for v in typed._unmarshall(text)]
+    print('response size: %d bytes, %d volumes' % (len(text), args.volumes))
+    report(args, [('decode, dynamic', lambda: dynamic._unmarshall(text)),
+                  ('decode, typed', lambda: typed._unmarshall(text)),
+                  ('decode + read, dynamic',
+                   lambda: read(dynamic._unmarshall(text))),
+                  ('decode + read, typed',
+                   lambda: read(typed._unmarshall(text)))])
+
+
+def bench_decode(args):
+    if args.file:
+        with open(args.file) as f:
+            text = f.read()
+    else:
+        text = fake_volume_list(args.volumes)
+    client = offline_client()
+
+    def decode():
+        return client._unmarshall(text)
+
+    def decode_and_read_state():
+        for v in client._unmarshall(text):
+            v.state
+
+    print('response size: %d bytes, %d volumes' %
+          (len(text), len(decode())))
+    report(args, [('decode', decode),
+                  ('decode + read state', decode_and_read_state)])
+
+
+def bench_marshall(args):
+    if args.file:
+        with open(args.file) as f:
+            text = f.read()
+    else:
+        text = fake_node(args.disks)
+    client = offline_client()
+    node = client._unmarshall(text)
+
+    def deep_copy():
+        # What diskUpdate did before: _to_dict() in _post_and_retry and
+        # again in _marshall().
+        data = client._to_dict(disks=node.disks)
+        return json.dumps(client._to_dict(data), sort_keys=True)
+
+    def marshall():
+        return client._marshall(client._to_payload(disks=node.disks))
+
+    assert json.loads(deep_copy()) == json.loads(marshall())
+    print('node size: %d bytes, %d disks' % (len(text), len(node.disks)))
+    report(args, [('to_dict + dumps', deep_copy),
+                  ('marshall', marshall)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    decode = subparsers.add_parser('decode', help='decode a volume list')
+    decode.add_argument('--volumes', type=int, default=500)
+    decode.add_argument('--file', help='recorded list_volume() response')
+    decode.set_defaults(func=bench_decode)
+
+    construct = subparsers.add_parser('construct',
+                                      help='construct a client')
+    construct.add_argument('--types', type=int, default=40)
+    construct.add_argument('--file', help='recorded /v1/schemas response')
+    construct.set_defaults(func=bench_construct)
+
+    marshall = subparsers.add_parser('marshall',
+                                     help='encode a diskUpdate request')
+    marshall.add_argument('--disks', type=int, default=100)
+    marshall.add_argument('--file', help='recorded by_id_node() response')
+    marshall.set_defaults(func=bench_marshall)
+
+    startup = subparsers.add_parser('startup',
+                                    help='start the CLI for list-volume')
+    startup.add_argument('--types', type=int, default=40)
+    startup.add_argument('--file', help='recorded /v1/schemas response')
+    startup.set_defaults(func=bench_startup)
+
+    replay = subparsers.add_parser('replay',
+                                   help='replay recorded API traffic')
+    replay.add_argument('--file', required=True,
+                        help='recording made with pytest --api-record')
+    replay.add_argument('--latency', type=float, default=0,
+                        help='seconds added to every response')
+    replay.add_argument('--recorded-latency', action='store_true',
+                        help='respond as slowly as when recorded')
+    replay.set_defaults(func=bench_replay)
+
+    scale = subparsers.add_parser('scale',
+                                  help='run against a fake manager')
+    scale.add_argument('--volumes', type=int, default=10000)
+    scale.add_argument('--concurrency', type=int, default=10)
+    scale.add_argument('--latency', type=float, default=0,
+                       help='seconds added to every response')
+    scale.set_defaults(func=bench_scale)
+
+    typed = subparsers.add_parser('typed',
+                                  help='decode with generated classes')
+    typed.add_argument('--volumes', type=int, default=500)
+    typed.set_defaults(func=bench_typed)
+
+    for p in [decode, construct, marshall, startup, replay, scale, typed]:
+        p.add_argument('--number', type=int, default=5)
+        p.add_argument('--repeat', type=int, default=3)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
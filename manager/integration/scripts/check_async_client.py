@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+#
+# Checks of longhorn.AsyncClient against the fake manager: bound methods
+# return coroutines, gather() fans calls out, no more than concurrency
+# calls are in flight at once, and actions run from a coroutine. No
+# cluster is required.
+#
+# Usage:
+#   check_async_client.py [--volumes N] [--concurrency N] [--latency S]
+#
+# Prints one line per check and exits with 1 if any of them fails.
+#
+
+from __future__ import print_function
+
+import argparse
+import asyncio
+import inspect
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'tests'))
+
+import fake_manager  # NOQA
+import longhorn  # NOQA
+
+
+class CountingTransport(longhorn.HttpTransport):
+    """
+    HttpTransport recording the most requests it had in flight at once.
+    """
+    def __init__(self, **kw):
+        super(CountingTransport, self).__init__(**kw)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kw):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return super(CountingTransport, self).request(method, url, **kw)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def reset(self):
+        with self._lock:
+            self.max_in_flight = self.in_flight
+
+
+def check_coroutines(ctx, args):
+    async def run():
+        calls = [ctx.async_client.list_volume(),
+                 ctx.async_client.by_id_node('node-0')]
+        kinds = [inspect.iscoroutine(c) for c in calls]
+        volumes, node = await asyncio.gather(*calls)
+        return kinds, volumes, node
+
+    kinds, volumes, node = asyncio.run(run())
+    assert all(kinds), 'bound methods returned %s' % kinds
+    assert len(volumes) == args.volumes, '%d volumes listed' % len(volumes)
+    assert node.name == 'node-0', 'by_id_node returned %s' % node.name
+    return 'list_volume() and by_id_node() return coroutines'
+
+
+def check_gather(ctx, args):
+    names = ctx.names[:args.concurrency * 2]
+
+    async def run():
+        return await ctx.async_client.gather(
+            *[ctx.async_client.by_id_volume(name) for name in names])
+
+    start = time.time()
+    volumes = asyncio.run(run())
+    elapsed = time.time() - start
+    serial = len(names) * args.latency
+
+    assert [v.name for v in volumes] == names, 'results out of order'
+    assert elapsed < serial / 2, \
+        '%d calls took %.2fs, serial would be %.2fs' % (
+            len(names), elapsed, serial)
+    return '%d by_id calls in %.2fs, %.2fs serial' % (len(names), elapsed,
+                                                      serial)
+
+
+def check_concurrency(ctx, args):
+    ctx.transport.reset()
+
+    async def run():
+        return await ctx.async_client.gather(
+            *[ctx.async_client.by_id_volume(name) for name in ctx.names])
+
+    asyncio.run(run())
+    peak = ctx.transport.max_in_flight
+    assert peak <= args.concurrency, \
+        '%d calls in flight for a concurrency of %d' % (peak,
+                                                        args.concurrency)
+    assert peak > 1, 'calls never overlapped'
+    return '%d calls, at most %d in flight (concurrency %d)' % (
+        len(ctx.names), peak, args.concurrency)
+
+
+def check_action(ctx, args):
+    name = ctx.names[0]
+
+    async def run():
+        volume = await ctx.async_client.by_id_volume(name)
+        attaching = await ctx.async_client.action(volume, 'attach',
+                                                  hostId='node-0')
+        return attaching
+
+    attaching = asyncio.run(run())
+    assert attaching.state == 'attaching', \
+        'volume is %s after attach' % attaching.state
+    return 'action(volume, "attach") from a coroutine'
+
+
+CHECKS = [
+    ('coroutine', check_coroutines),
+    ('gather', check_gather),
+    ('bounded', check_concurrency),
+    ('action', check_action),
+]
+
+
+class Context(object):
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--volumes', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds added to every response')
+    args = parser.parse_args()
+
+    manager = fake_manager.FakeManager(latency=args.latency)
+    base = manager.start()
+    manager.add_volumes(args.volumes)
+
+    ctx = Context()
+    ctx.transport = CountingTransport(pool_size=args.concurrency * 2)
+    ctx.client = longhorn.Client(url=base + '/schemas',
+                                 transport=ctx.transport)
+    ctx.async_client = longhorn.AsyncClient(ctx.client, args.concurrency)
+    ctx.names = ['vol-%06d' % i for i in range(args.volumes)]
+
+    failed = 0
+    for name, check in CHECKS:
+        try:
+            print('ok    %-10s %s' % (name, check(ctx, args)))
+        except AssertionError as e:
+            failed += 1
+            print('FAIL  %-10s %s' % (name, e))
+    ctx.async_client.close()
+    manager.stop()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+#
+# Checks of longhorn.HttpTransport and get_transport() against a local HTTP
+# server: connection pooling, sharing one transport between threads, and
+# request timeouts. No cluster is required.
+#
+# Usage:
+#   check_transport.py [--threads N] [--requests N] [--pool-size N]
+#
+# Prints one line per check and exits with 1 if any of them fails.
+#
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import requests
+from six.moves import BaseHTTPServer, socketserver
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'tests'))
+
+import longhorn  # NOQA
+
+SLOW_DELAY = 2
+
+
+class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), Handler)
+        self.connections = set()
+        self.lock = threading.Lock()
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def base(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def handle_error(self, request, client_address):
+        # The timeout check hangs up on /slow before it is answered.
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError,
+                                              ConnectionResetError)):
+            BaseHTTPServer.HTTPServer.handle_error(self, request,
+                                                   client_address)
+
+    def reset(self):
+        with self.lock:
+            self.connections.clear()
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # Echoes the path and the client port, so a response can be matched
+    # to its request and connections counted. /slow answers after
+    # SLOW_DELAY seconds.
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.connections.add(self.client_address)
+        if self.path == '/slow':
+            time.sleep(SLOW_DELAY)
+        body = json.dumps({'path': self.path,
+                           'port': self.client_address[1]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def check_pooling(server, args):
+    server.reset()
+    transport = longhorn.HttpTransport()
+    for i in range(args.requests):
+        transport.request('GET', server.base + '/pooled/%d' % i)
+    pooled = len(server.connections)
+    transport.close()
+
+    server.reset()
+    transport = longhorn.HttpTransport(keep_alive=False)
+    for i in range(args.requests):
+        transport.request('GET', server.base + '/unpooled/%d' % i)
+    unpooled = len(server.connections)
+    transport.close()
+
+    assert pooled == 1, '%d connections for serial requests' % pooled
+    assert unpooled == args.requests, \
+        '%d connections without keep-alive' % unpooled
+    return '%d serial requests on %d connection, %d without keep-alive' % (
+        args.requests, pooled, unpooled)
+
+
+def check_threads(server, args):
+    server.reset()
+    transport = longhorn.HttpTransport(pool_size=args.pool_size,
+                                       pool_block=True)
+    errors = []
+
+    def worker(t):
+        for i in range(args.requests):
+            path = '/thread/%d/%d' % (t, i)
+            try:
+                r = transport.request('GET', server.base + path)
+                got = r.json()['path']
+                if got != path:
+                    errors.append('%s answered for %s' % (got, path))
+            except Exception as e:
+                errors.append(repr(e))
+
+    threads = [threading.Thread(target=worker, args=(t,))
+               for t in range(args.threads)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+    transport.close()
+
+    assert not errors, '%d errors, first: %s' % (len(errors), errors[0])
+    assert len(server.connections) <= args.pool_size, \
+        '%d connections for a pool of %d' % (len(server.connections),
+                                             args.pool_size)
+    return '%d threads x %d requests in %.2fs on %d connections' % (
+        args.threads, args.requests, elapsed, len(server.connections))
+
+
+def check_timeouts(server, args):
+    transport = longhorn.HttpTransport(timeout=(1, 0.2))
+    start = time.time()
+    try:
+        transport.request('GET', server.base + '/slow')
+        raise AssertionError('no timeout for a slow response')
+    except requests.exceptions.ReadTimeout:
+        elapsed = time.time() - start
+    assert elapsed < SLOW_DELAY, 'timed out after %.2fs' % elapsed
+
+    r = transport.request('GET', server.base + '/slow',
+                          timeout=(1, SLOW_DELAY * 2))
+    assert r.json()['path'] == '/slow'
+    transport.close()
+    return 'read timeout after %.2fs, per-request timeout honoured' % elapsed
+
+
+def check_shared(server, args):
+    address = server.base[len('http://'):]
+    transport = longhorn.get_transport(address)
+    assert longhorn.get_transport(address) is transport
+    assert longhorn.get_transport('127.0.0.1:1') is not transport
+    return 'get_transport() shares one transport per address'
+
+
+CHECKS = [
+    ('pooling', check_pooling),
+    ('threads', check_threads),
+    ('timeouts', check_timeouts),
+    ('shared', check_shared),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--pool-size', type=int, default=4)
+    args = parser.parse_args()
+
+    server = Server()
+    failed = 0
+    for name, check in CHECKS:
+        try:
+            print('ok    %-10s %s' % (name, check(server, args)))
+        except AssertionError as e:
+            failed += 1
+            print('FAIL  %-10s %s' % (name, e))
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,673 @@
+#!/usr/bin/env python
+#
+# In-process stand-in for the Longhorn manager API, for load testing the
+# client in manager/integration/tests/longhorn.py without a cluster.
+#
+# It serves /v1/schemas and the volume, node, setting, engineImage and
+# backupVolume collections, with simple state machines (a volume goes
+# attaching -> attached, degraded -> healthy after a delay) and optional
+# latency on every response. GET responses carry an ETag and If-None-Match
+# is answered with 304. State is kept in memory only.
+#
+# Usage:
+#   fake_manager.py [--port 9500] [--volumes N] [--latency S]
+#
+# or from Python:
+#   manager = FakeManager(latency=0.01)
+#   url = manager.start()          # http://127.0.0.1:<port>/v1
+#   manager.add_volumes(10000)
+#   ...
+#   manager.stop()
+#
+
+from __future__ import print_function
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import urlparse, parse_qs
+
+# Collection name in URLs for each type.
+COLLECTIONS = {
+    'volume': 'volumes',
+    'node': 'nodes',
+    'setting': 'settings',
+    'engineImage': 'engineimages',
+    'backupVolume': 'backupvolumes',
+}
+
+VOLUME_ACTIONS = ['attach', 'detach', 'updateReplicaCount',
+                  'replicaRemove', 'salvage', 'activate', 'expand']
+NODE_ACTIONS = ['diskUpdate']
+
+DEFAULT_SETTINGS = {
+    'backup-target': '',
+    'backup-target-credential-secret': '',
+    'create-default-disk-labeled-nodes': 'false',
+    'default-data-path': '/var/lib/longhorn/',
+    'default-replica-count': '3',
+    'replica-soft-anti-affinity': 'false',
+    'storage-over-provisioning-percentage': '500',
+    'storage-minimal-available-percentage': '10',
+    'upgrade-checker': 'false',
+}
+
+DEFAULT_ENGINE_IMAGE = 'longhornio/longhorn-engine:master'
+
+
+class ApiError(Exception):
+    def __init__(self, status, code, message):
+        super(ApiError, self).__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+def _field(type, create=False, update=False):
+    return {'type': type, 'create': create, 'update': update,
+            'nullable': True}
+
+
+SCHEMA_FIELDS = {
+    'volume': {
+        'name': _field('string', create=True),
+        'size': _field('string', create=True),
+        'numberOfReplicas': _field('int', create=True),
+        'frontend': _field('string', create=True),
+        'baseImage': _field('string', create=True),
+        'fromBackup': _field('string', create=True),
+        'staleReplicaTimeout': _field('int', create=True),
+        'engineImage': _field('string', create=True),
+        'currentImage': _field('string'),
+        'state': _field('string'),
+        'robustness': _field('string'),
+        'standby': _field('boolean'),
+        'disableFrontend': _field('boolean'),
+        'initialRestorationRequired': _field('boolean'),
+        'created': _field('date'),
+        'lastBackup': _field('string'),
+        'lastBackupAt': _field('string'),
+        'conditions': _field('map[condition]'),
+        'kubernetesStatus': _field('kubernetesStatus'),
+        'replicas': _field('array[replica]'),
+        'controllers': _field('array[controller]'),
+        'recurringJobs': _field('array[recurringJob]'),
+    },
+    'replica': {
+        'name': _field('string'),
+        'hostId': _field('string'),
+        'mode': _field('string'),
+        'running': _field('boolean'),
+        'failedAt': _field('string'),
+        'dataPath': _field('string'),
+    },
+    'controller': {
+        'name': _field('string'),
+        'hostId': _field('string'),
+        'endpoint': _field('string'),
+    },
+    'condition': {
+        'type': _field('string'),
+        'status': _field('string'),
+        'reason': _field('string'),
+        'message': _field('string'),
+    },
+    'kubernetesStatus': {
+        'pvName': _field('string'),
+        'pvStatus': _field('string'),
+        'namespace': _field('string'),
+        'pvcName': _field('string'),
+        'workloadsStatus': _field('array[workloadStatus]'),
+    },
+    'workloadStatus': {
+        'podName': _field('string'),
+        'podStatus': _field('string'),
+        'workloadName': _field('string'),
+        'workloadType': _field('string'),
+    },
+    'recurringJob': {
+        'name': _field('string'),
+        'task': _field('string'),
+        'cron': _field('string'),
+        'retain': _field('int'),
+    },
+    'node': {
+        'name': _field('string'),
+        'address': _field('string'),
+        'allowScheduling': _field('boolean', update=True),
+        'tags': _field('array[string]', update=True),
+        'region': _field('string'),
+        'zone': _field('string'),
+        'conditions': _field('map[condition]'),
+        'disks': _field('map[diskSpec]'),
+    },
+    'diskSpec': {
+        'path': _field('string'),
+        'allowScheduling': _field('boolean'),
+        'storageReserved': _field('int'),
+        'storageMaximum': _field('int'),
+        'storageAvailable': _field('int'),
+        'storageScheduled': _field('int'),
+        'tags': _field('array[string]'),
+        'conditions': _field('map[condition]'),
+    },
+    'setting': {
+        'name': _field('string'),
+        'value': _field('string', update=True),
+    },
+    'engineImage': {
+        'name': _field('string'),
+        'image': _field('string', create=True),
+        'state': _field('string'),
+        'default': _field('boolean'),
+        'refCount': _field('int'),
+    },
+    'backupVolume': {
+        'name': _field('string'),
+        'size': _field('string'),
+        'lastBackupName': _field('string'),
+    },
+    'attachInput': {
+        'hostId': _field('string', create=True),
+        'disableFrontend': _field('boolean', create=True),
+    },
+    'updateReplicaCountInput': {
+        'replicaCount': _field('int', create=True),
+    },
+    'replicaRemoveInput': {
+        'name': _field('string', create=True),
+    },
+    'diskUpdateInput': {
+        'disks': _field('map[diskSpec]', create=True),
+    },
+}
+
+ACTION_INPUTS = {
+    'attach': 'attachInput',
+    'updateReplicaCount': 'updateReplicaCountInput',
+    'replicaRemove': 'replicaRemoveInput',
+    'diskUpdate': 'diskUpdateInput',
+}
+
+# Resource methods allowed on each type; collections allow GET and POST
+# unless listed in READ_ONLY_COLLECTIONS.
+RESOURCE_METHODS = {
+    'volume': ['GET', 'DELETE'],
+    'node': ['GET', 'PUT'],
+    'setting': ['GET', 'PUT'],
+    'engineImage': ['GET', 'DELETE'],
+    'backupVolume': ['GET', 'DELETE'],
+}
+READ_ONLY_COLLECTIONS = ('node', 'setting', 'backupVolume')
+
+
+class FakeManager(object):
+    """
+    Fake Longhorn manager API server.
+
+    latency is added to every response. Volumes take attach_delay seconds
+    to attach or detach, and rebuild_delay seconds to get back to healthy
+    after losing a replica or having their replica count raised. Deleted
+    volumes disappear after delete_delay seconds.
+    """
+    def __init__(self, nodes=3, latency=0, attach_delay=0.5,
+                 rebuild_delay=1.0, delete_delay=0.2):
+        self.latency = latency
+        self.attach_delay = attach_delay
+        self.rebuild_delay = rebuild_delay
+        self.delete_delay = delete_delay
+        self.requests = 0
+        self._store = dict((type, {}) for type in COLLECTIONS)
+        # (type, id) -> [(due time, changes, or None to delete)]
+        self._pending = {}
+        self._lock = threading.RLock()
+        self._server = None
+        self.base = None
+
+        for i in range(nodes):
+            self._add_node('node-%d' % i)
+        for name, value in DEFAULT_SETTINGS.items():
+            self._store['setting'][name] = {'name': name, 'value': value}
+        self._store['engineImage']['ei-default'] = {
+            'name': 'ei-default', 'image': DEFAULT_ENGINE_IMAGE,
+            'state': 'ready', 'default': True, 'refCount': 0,
+        }
+
+    # Server
+
+    def start(self, host='127.0.0.1', port=0):
+        manager = self
+
+        class Handler(_Handler):
+            pass
+        Handler.manager = manager
+
+        class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self._server = Server((host, port), Handler)
+        self.base = 'http://%s:%d/v1' % self._server.server_address
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self.base
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # Seeding
+
+    def _add_node(self, name):
+        self._store['node'][name] = {
+            'name': name, 'address': '10.42.0.%d' % len(self._store['node']),
+            'allowScheduling': True, 'tags': [], 'region': '', 'zone': '',
+            'conditions': {'Ready': {'type': 'Ready', 'status': 'True'}},
+            'disks': {
+                'default-disk': {
+                    'path': '/var/lib/longhorn/', 'allowScheduling': True,
+                    'storageReserved': 0, 'storageMaximum': 107374182400,
+                    'storageAvailable': 107374182400,
+                    'storageScheduled': 0, 'tags': [],
+                    'conditions': {
+                        'Ready': {'type': 'Ready', 'status': 'True'},
+                        'Schedulable': {'type': 'Schedulable',
+                                        'status': 'True'},
+                    },
+                },
+            },
+        }
+
+    def add_volumes(self, count, prefix='vol-', state='detached'):
+        """Add count volumes directly, without going through the API."""
+        with self._lock:
+            start = len(self._store['volume'])
+            for i in range(start, start + count):
+                volume = self._new_volume({'name': '%s%06d' % (prefix, i)})
+                if state == 'attached':
+                    self._attach(volume, 'node-0')
+                self._store['volume'][volume['name']] = volume
+
+    def add_backup_volume(self, name, size='16777216'):
+        with self._lock:
+            self._store['backupVolume'][name] = {
+                'name': name, 'size': size, 'lastBackupName': '',
+                'created': _now(),
+            }
+
+    # State machines
+
+    def _later(self, type, id, delay, changes):
+        self._pending.setdefault((type, id), []).append(
+            (time.time() + delay, changes))
+
+    def _settle(self, type, id):
+        pending = self._pending.get((type, id))
+        if not pending:
+            return
+        now = time.time()
+        while pending and pending[0][0] <= now:
+            changes = pending.pop(0)[1]
+            if changes is None:
+                self._store[type].pop(id, None)
+                pending = None
+                break
+            obj = self._store[type].get(id)
+            if obj is not None:
+                obj.update(changes)
+        if not pending:
+            self._pending.pop((type, id), None)
+
+    def _settle_all(self, type):
+        for key in [k for k in self._pending if k[0] == type]:
+            self._settle(*key)
+
+    def _new_volume(self, data):
+        name = data.get('name')
+        if not name:
+            raise ApiError(422, 'InvalidInput', 'volume name is required')
+        count = int(data.get('numberOfReplicas') or 3)
+        volume = {
+            'name': name,
+            'size': str(data.get('size') or '16777216'),
+            'numberOfReplicas': count,
+            'frontend': data.get('frontend') or 'blockdev',
+            'baseImage': data.get('baseImage') or '',
+            'fromBackup': data.get('fromBackup') or '',
+            'staleReplicaTimeout': int(data.get('staleReplicaTimeout') or 20),
+            'engineImage': data.get('engineImage') or DEFAULT_ENGINE_IMAGE,
+            'currentImage': data.get('engineImage') or DEFAULT_ENGINE_IMAGE,
+            'state': 'detached',
+            'robustness': 'unknown',
+            'standby': False,
+            'disableFrontend': False,
+            'initialRestorationRequired': False,
+            'created': _now(),
+            'lastBackup': '', 'lastBackupAt': '',
+            'conditions': {
+                'scheduled': {'type': 'scheduled', 'status': 'True'},
+            },
+            'kubernetesStatus': {'pvName': '', 'pvStatus': '',
+                                 'namespace': '', 'pvcName': '',
+                                 'workloadsStatus': None},
+            'controllers': [],
+            'replicas': [],
+            'recurringJobs': None,
+        }
+        self._set_replicas(volume, count)
+        return volume
+
+    def _set_replicas(self, volume, count):
+        nodes = sorted(self._store['node'])
+        replicas = volume['replicas'][:count]
+        for i in range(len(replicas), count):
+            replicas.append({
+                'name': '%s-r-%d' % (volume['name'], i),
+                'hostId': nodes[i % len(nodes)] if nodes else '',
+                'mode': '', 'running': False, 'failedAt': '',
+                'dataPath': '/var/lib/longhorn/replicas/' + volume['name'],
+            })
+        volume['replicas'] = replicas
+
+    def _attach(self, volume, host_id):
+        volume.update(state='attached', robustness='healthy')
+        volume['controllers'] = [{
+            'name': volume['name'] + '-e-0', 'hostId': host_id,
+            'endpoint': '/dev/longhorn/' + volume['name'],
+        }]
+        for r in volume['replicas']:
+            r.update(mode='RW', running=True)
+
+    # Handlers, all called with the lock held
+
+    def create(self, type, data):
+        if type == 'volume':
+            obj = self._new_volume(data)
+            if obj['name'] in self._store['volume']:
+                raise ApiError(409, 'Conflict',
+                               'volume %s already exists' % obj['name'])
+            self._store['volume'][obj['name']] = obj
+            return type, obj
+        if type == 'engineImage':
+            image = data.get('image')
+            if not image:
+                raise ApiError(422, 'InvalidInput', 'image is required')
+            name = 'ei-' + hashlib.sha1(image.encode('utf-8')).hexdigest()[:8]
+            obj = {'name': name, 'image': image, 'state': 'deploying',
+                   'default': False, 'refCount': 0}
+            self._store['engineImage'][name] = obj
+            self._later(type, name, self.attach_delay, {'state': 'ready'})
+            return type, obj
+        raise ApiError(405, 'MethodNotAllowed', 'cannot create ' + type)
+
+    def update(self, type, obj, data):
+        fields = SCHEMA_FIELDS[type]
+        for k, v in data.items():
+            if k in fields and fields[k].get('update'):
+                obj[k] = v
+        return type, obj
+
+    def delete(self, type, obj):
+        if type == 'engineImage' and obj.get('default'):
+            raise ApiError(400, 'BadRequest',
+                           'cannot delete the default engine image')
+        if type == 'volume':
+            obj['state'] = 'deleting'
+            self._later(type, obj['name'], self.delete_delay, None)
+        else:
+            del self._store[type][obj['name']]
+        return type, obj
+
+    def action(self, type, obj, name, data):
+        if type == 'node' and name == 'diskUpdate':
+            obj['disks'] = data.get('disks') or {}
+            return type, obj
+        if type != 'volume' or name not in VOLUME_ACTIONS:
+            raise ApiError(404, 'NotFound', 'no action ' + name)
+
+        if name == 'attach':
+            if obj['state'] != 'detached':
+                raise ApiError(409, 'Conflict', 'volume is ' + obj['state'])
+            obj['state'] = 'attaching'
+            attached = dict(obj, replicas=[dict(r) for r in obj['replicas']])
+            self._attach(attached, data.get('hostId') or 'node-0')
+            self._later(type, obj['name'], self.attach_delay, {
+                'state': 'attached', 'robustness': 'healthy',
+                'controllers': attached['controllers'],
+                'replicas': attached['replicas'],
+            })
+        elif name == 'detach':
+            if obj['state'] in ('detached', 'detaching'):
+                return type, obj
+            obj['state'] = 'detaching'
+            replicas = [dict(r, mode='', running=False)
+                        for r in obj['replicas']]
+            self._later(type, obj['name'], self.attach_delay, {
+                'state': 'detached', 'robustness': 'unknown',
+                'controllers': [], 'replicas': replicas,
+            })
+        elif name in ('updateReplicaCount', 'replicaRemove'):
+            if name == 'updateReplicaCount':
+                count = int(data.get('replicaCount') or 0)
+                obj['numberOfReplicas'] = count
+            else:
+                obj['replicas'] = [r for r in obj['replicas']
+                                   if r['name'] != data.get('name')]
+                count = obj['numberOfReplicas']
+            if obj['state'] == 'attached' and \
+                    len(obj['replicas']) < count:
+                obj['robustness'] = 'degraded'
+                rebuilt = dict(obj,
+                               replicas=[dict(r) for r in obj['replicas']])
+                self._set_replicas(rebuilt, count)
+                self._attach(rebuilt, obj['controllers'][0]['hostId'])
+                self._later(type, obj['name'], self.rebuild_delay, {
+                    'robustness': 'healthy',
+                    'replicas': rebuilt['replicas'],
+                })
+            else:
+                self._set_replicas(obj, count)
+        return type, obj
+
+    # Rendering
+
+    def render(self, type, obj):
+        url = '%s/%s/%s' % (self.base, COLLECTIONS[type], obj['name'])
+        result = dict(obj, id=obj['name'], type=type, links={'self': url})
+        actions = []
+        if type == 'volume':
+            actions = VOLUME_ACTIONS
+        elif type == 'node':
+            actions = NODE_ACTIONS
+        result['actions'] = dict((a, url + '?action=' + a) for a in actions)
+        return result
+
+    def render_list(self, type, params):
+        self._settle_all(type)
+        items = [self._store[type][k] for k in sorted(self._store[type])]
+        for k, v in params.items():
+            if k in SCHEMA_FIELDS[type]:
+                items = [i for i in items if str(i.get(k)) == v]
+
+        pagination = None
+        limit = int(params.get('limit', 0) or 0)
+        if limit > 0:
+            marker = params.get('marker')
+            if marker:
+                items = [i for i in items if i['name'] > marker]
+            if len(items) > limit:
+                items = items[:limit]
+                next_url = '%s/%s?limit=%d&marker=%s' % (
+                    self.base, COLLECTIONS[type], limit, items[-1]['name'])
+                pagination = {'limit': limit, 'next': next_url}
+            else:
+                pagination = {'limit': limit, 'next': None}
+
+        return {
+            'type': 'collection', 'resourceType': type,
+            'links': {'self': '%s/%s' % (self.base, COLLECTIONS[type])},
+            'createTypes': {}, 'actions': {}, 'sortLinks': {},
+            'pagination': pagination, 'sort': None, 'filters': {},
+            'data': [self.render(type, i) for i in items],
+        }
+
+    def render_schemas(self):
+        data = []
+        for type, fields in sorted(SCHEMA_FIELDS.items()):
+            schema = {
+                'id': type, 'type': 'schema',
+                'links': {'self': '%s/schemas/%s' % (self.base, type)},
+                'resourceFields': fields,
+                'collectionMethods': [], 'resourceMethods': [],
+                'resourceActions': {}, 'collectionFilters': {},
+            }
+            if type in COLLECTIONS:
+                schema['links']['collection'] = '%s/%s' % (
+                    self.base, COLLECTIONS[type])
+                schema['collectionMethods'] = ['GET'] \
+                    if type in READ_ONLY_COLLECTIONS else ['GET', 'POST']
+                schema['resourceMethods'] = RESOURCE_METHODS[type]
+                actions = {'volume': VOLUME_ACTIONS,
+                           'node': NODE_ACTIONS}.get(type, [])
+                schema['resourceActions'] = dict(
+                    (a, {'input': ACTION_INPUTS.get(a), 'output': type})
+                    for a in actions)
+            data.append(schema)
+        return {'type': 'collection', 'resourceType': 'schema',
+                'links': {'self': self.base + '/schemas'}, 'data': data}
+
+    def handle(self, method, path, params, data):
+        """
+        Return (status, body) for a request, path relative to /v1.
+        """
+        parts = [p for p in path.split('/') if p]
+        types = dict((v, k) for k, v in COLLECTIONS.items())
+        with self._lock:
+            self.requests += 1
+            if not parts or parts[0] == 'schemas':
+                if method != 'GET':
+                    raise ApiError(405, 'MethodNotAllowed', method)
+                return 200, self.render_schemas()
+
+            type = types.get(parts[0])
+            if type is None or len(parts) > 2:
+                raise ApiError(404, 'NotFound', path)
+
+            if len(parts) == 1:
+                if method == 'GET':
+                    return 200, self.render_list(type, params)
+                if method == 'POST' and type not in READ_ONLY_COLLECTIONS:
+                    return 200, self.render(*self.create(type, data))
+                raise ApiError(405, 'MethodNotAllowed', method)
+
+            self._settle(type, parts[1])
+            obj = self._store[type].get(parts[1])
+            if obj is None:
+                raise ApiError(404, 'NotFound',
+                               '%s %s not found' % (type, parts[1]))
+            if method == 'POST' and 'action' in params:
+                return 200, self.render(
+                    *self.action(type, obj, params['action'], data))
+            if method not in RESOURCE_METHODS[type]:
+                raise ApiError(405, 'MethodNotAllowed', method)
+            if method == 'GET':
+                return 200, self.render(type, obj)
+            if method == 'PUT':
+                return 200, self.render(*self.update(type, obj, data))
+            return 200, self.render(*self.delete(type, obj))
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, keep-alive
+    # requests stall on delayed ACKs.
+    disable_nagle_algorithm = True
+    manager = None
+
+    def _handle(self, method):
+        u = urlparse(self.path)
+        params = dict((k, v[0]) for k, v in parse_qs(u.query).items())
+        data = {}
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            data = json.loads(self.rfile.read(length).decode('utf-8'))
+
+        if self.manager.latency:
+            time.sleep(self.manager.latency)
+        path = u.path[len('/v1'):] if u.path.startswith('/v1') else None
+        try:
+            if path is None:
+                raise ApiError(404, 'NotFound', u.path)
+            status, body = self.manager.handle(method, path, params, data)
+        except ApiError as e:
+            status = e.status
+            body = {'type': 'error', 'status': e.status, 'code': e.code,
+                    'message': e.message}
+
+        body = json.dumps(body).encode('utf-8')
+        etag = None
+        if method == 'GET' and status == 200:
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                status, body = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-API-Schemas', self.manager.base + '/schemas')
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def log_message(self, *args):
+        pass
+
+
+def _now():
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=9500)
+    parser.add_argument('--nodes', type=int, default=3)
+    parser.add_argument('--volumes', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds added to every response')
+    parser.add_argument('--attach-delay', type=float, default=0.5)
+    parser.add_argument('--rebuild-delay', type=float, default=1.0)
+    args = parser.parse_args()
+
+    manager = FakeManager(nodes=args.nodes, latency=args.latency,
+                          attach_delay=args.attach_delay,
+                          rebuild_delay=args.rebuild_delay)
+    manager.add_volumes(args.volumes)
+    print('serving', manager.start(port=args.port))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        manager.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+#
+# Generate a module of typed resource classes from a saved Longhorn API
+# schema, for GdapiClient(resources=module).
+#
+# Usage:
+#   curl http://<manager>:9500/v1/schemas > schemas.json
+#   generate_resources.py schemas.json -o longhorn_resources.py
+#
+# Each schema type becomes a longhorn.TypedResource subclass with
+# __slots__ = (), a LazyField for every field holding nested objects and
+# a method for every resource action. The client only uses the module
+# while the manager's schema has the same types, fields and actions as
+# the one it was generated from.
+#
+
+from __future__ import print_function
+
+import argparse
+import keyword
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'tests'))
+
+import longhorn  # NOQA
+
+SCALAR_TYPES = frozenset([
+    'string', 'password', 'int', 'float', 'boolean', 'date', 'enum',
+    'blob', 'base64', 'dnsLabel', 'hostname', 'intOrString',
+])
+
+ARRAY_RE = re.compile(r'^array\[(.*)\]$')
+MAP_RE = re.compile(r'^map\[(.*)\]$')
+
+
+def load_schema(text):
+    client = longhorn.GdapiClient.__new__(longhorn.GdapiClient)
+    client.resources = None
+    return longhorn.Schema(text, client._unmarshall(text))
+
+
+def class_name(type_name, taken):
+    name = re.sub(r'[^0-9a-zA-Z_]', '_', type_name)
+    name = name[:1].upper() + name[1:]
+    if not name or name[0].isdigit() or keyword.iskeyword(name):
+        name = 'T' + name
+    while name in taken:
+        name += '_'
+    taken.add(name)
+    return name
+
+
+def decoder(field_type, classes):
+    """
+    Python expression decoding a value of field_type, or None for values
+    that are used as they are.
+    """
+    if field_type is None:
+        return 'longhorn.decode_any'
+    if field_type in SCALAR_TYPES or field_type.startswith('reference['):
+        return None
+
+    m = ARRAY_RE.match(field_type)
+    if m:
+        inner = decoder(m.group(1), classes)
+        if inner is None:
+            return None
+        return 'longhorn.decode_array(%s)' % inner
+
+    m = MAP_RE.match(field_type)
+    if m:
+        inner = decoder(m.group(1), classes) or 'longhorn.decode_any'
+        return 'longhorn.decode_map(%s)' % inner
+
+    if field_type in classes:
+        return '%s.decode' % classes[field_type]
+    return 'longhorn.decode_any'
+
+
+def generate(text, source='schemas.json'):
+    schema = load_schema(text)
+    reserved = set(dir(longhorn.TypedResource))
+    taken = set()
+    classes = dict((t, class_name(t, taken)) for t in sorted(schema.types))
+
+    body = []
+    lazy = []
+    for type_name in sorted(schema.types):
+        typ = schema.types[type_name]
+        cls = classes[type_name]
+        fields = longhorn._fields(typ.__dict__.get('resourceFields'))
+        actions = longhorn._fields(typ.__dict__.get('resourceActions'))
+
+        doc = ['    """', '    %s resource.' % type_name]
+        if fields:
+            doc.append('')
+        for name in sorted(fields):
+            field_type = longhorn._fields(fields[name]).get('type')
+            doc.append('    %s: %s' % (name, field_type))
+            expr = decoder(field_type, classes)
+            if expr is None:
+                continue
+            if name in reserved:
+                raise ValueError('%s.%s clashes with a TypedResource '
+                                 'attribute' % (type_name, name))
+            lazy.append((cls, name, expr))
+        doc.append('    """')
+
+        body.append('')
+        body.append('')
+        body.append('class %s(longhorn.TypedResource):' % cls)
+        body.extend(doc)
+        body.append('    __slots__ = ()')
+        for name in sorted(actions):
+            method = name
+            if name in fields:
+                method = name + '_action'
+            if not re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', method) or \
+                    keyword.iskeyword(method) or method in reserved:
+                continue
+            body.append('')
+            body.append('    def %s(self, *args, **kw):' % method)
+            body.append('        return self._client.action(self, %r, '
+                        '*args, **kw)' % name)
+
+    out = [
+        '# Generated by scripts/generate_resources.py from %s.' % source,
+        '# Do not edit; regenerate when the Longhorn API schema changes.',
+        '',
+        'import longhorn',
+        '',
+        'SCHEMA_FINGERPRINT = %r' % schema.fingerprint(),
+    ]
+    out.extend(body)
+    out.append('')
+    out.append('')
+    for cls, name, expr in lazy:
+        if re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', name) and \
+                not keyword.iskeyword(name):
+            out.append('%s.%s = longhorn.LazyField(' % (cls, name))
+            out.append('    %r, %s)' % (name, expr))
+        else:
+            out.append('setattr(%s, %r, longhorn.LazyField(' % (cls, name))
+            out.append('    %r, %s))' % (name, expr))
+    out.append('')
+    out.append('CLASSES = {')
+    for type_name in sorted(classes):
+        out.append('    %r: %s,' % (type_name, classes[type_name]))
+    out.append('}')
+    return '\n'.join(out) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('schema', help='saved /v1/schemas response')
+    parser.add_argument('-o', '--output', help='module to write '
+                        '(default: stdout)')
+    args = parser.parse_args()
+
+    with open(args.schema) as f:
+        text = generate(f.read(), os.path.basename(args.schema))
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+
+if __name__ == '__main__':
+    main()
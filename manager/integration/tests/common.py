@@ -9,13 +9,19 @@ import subprocess
 import json
 import hashlib
 import signal
+import concurrent.futures
+import threading
+import contextlib
+import copy
+import weakref
 
-import socket
 import pytest
+import urllib3
 
 import longhorn
 
 from kubernetes import client as k8sclient, config as k8sconfig
+from kubernetes import watch as k8swatch
 from kubernetes.client import Configuration
 from kubernetes.stream import stream
 
@@ -46,6 +52,19 @@ RETRY_BACKUP_INTERVAL = 0.5
 RETRY_EXEC_COUNTS = 30
 RETRY_EXEC_INTERVAL = 5
 
+# wait_until() deadlines and polling cadence, in seconds. Polling starts
+# fast right after an action and backs off towards WAIT_INTERVAL_MAX.
+WAIT_TIMEOUT = RETRY_COUNTS * RETRY_INTERVAL
+WAIT_BACKUP_TIMEOUT = RETRY_BACKUP_COUNTS * RETRY_BACKUP_INTERVAL
+WAIT_INTERVAL_MIN = 0.1
+WAIT_INTERVAL_MAX = 1
+WAIT_BACKOFF = 1.5
+# Longest single Kubernetes watch request before it is resumed.
+K8S_WATCH_TIMEOUT = 60
+
+# Thread pool size for cleanup steps and the work within each step.
+CLEANUP_WORKERS = 8
+
 LONGHORN_NAMESPACE = "longhorn-system"
 
 COMPATIBILTY_TEST_IMAGE_PREFIX = "longhornio/longhorn-test:version-test"
@@ -112,6 +131,16 @@ DEFAULT_LONGHORN_STATIC_STORAGECLASS_NAME = "longhorn-static"
 
 DEFAULT_REPLICA_DIRECTORY = os.path.join(DEFAULT_DISK_PATH, "replicas/")
 
+# Setting values reset_settings() restores between tests.
+RESET_SETTINGS = {
+    SETTING_STORAGE_MINIMAL_AVAILABLE_PERCENTAGE:
+        DEFAULT_STORAGE_MINIMAL_AVAILABLE_PERCENTAGE,
+    SETTING_STORAGE_OVER_PROVISIONING_PERCENTAGE:
+        DEFAULT_STORAGE_OVER_PROVISIONING_PERCENTAGE,
+    SETTING_DEFAULT_DATA_PATH: DEFAULT_DISK_PATH,
+    SETTING_CREATE_DEFAULT_DISK_LABELED_NODES: "false",
+}
+
 NODE_CONDITION_MOUNTPROPAGATION = "MountPropagation"
 DISK_CONDITION_SCHEDULABLE = "Schedulable"
 DISK_CONDITION_READY = "Ready"
@@ -154,52 +183,174 @@ INSTANCE_MANAGER_HOST_PATH_PREFIX = "/host"
 EXPANSION_SNAP_TMP_META_NAME_PATTERN = "volume-snap-expand-%s.img.meta.tmp"
 
 
-def load_k8s_config():
-    c = Configuration()
-    c.assert_hostname = False
-    Configuration.set_default(c)
-    k8sconfig.load_incluster_config()
+# API clients built by the get_*_client() factories, shared for the whole
+# session until invalidate_api_clients().
+_api_clients = {}
+_api_clients_lock = threading.RLock()
+
+# A cached Longhorn client is checked again when it is fetched more than
+# this many seconds after its last check.
+LONGHORN_CLIENT_CHECK_INTERVAL = 30
+_longhorn_clients_checked = {}
+
+
+def _cached_api_client(key, factory, fresh=False, drop=()):
+    # factory() runs without the lock, so a slow lookup doesn't hold up the
+    # threads using other clients. If two threads build the same client,
+    # the first one published wins unless fresh is set. Keys in drop are
+    # forgotten along with the new client being published.
+    if not fresh:
+        with _api_clients_lock:
+            if key in _api_clients:
+                return _api_clients[key]
+    client = factory()
+    with _api_clients_lock:
+        for k in drop:
+            _api_clients.pop(k, None)
+        if fresh:
+            _api_clients[key] = client
+        return _api_clients.setdefault(key, client)
+
+
+def invalidate_api_clients():
+    """
+    Forget every cached API client, the Kubernetes config and the Longhorn
+    manager addresses. Call it after deliberately restarting or upgrading
+    Longhorn components; the next get_*_client() call starts afresh.
+    """
+    with _api_clients_lock:
+        _api_clients.clear()
+        _longhorn_clients_checked.clear()
 
 
-def get_apps_api_client():
-    load_k8s_config()
-    return k8sclient.AppsV1Api()
+# Cached clients built on the shared Kubernetes ApiClient.
+K8S_API_CLIENTS = ('apps', 'core', 'storage', 'version')
 
 
-def get_core_api_client():
-    load_k8s_config()
-    return k8sclient.CoreV1Api()
+def load_k8s_config(fresh=False):
+    """
+    Load the in-cluster config once and return the Kubernetes ApiClient,
+    and so the HTTP pool, that all of the Kubernetes API clients share.
+    fresh=True reloads it and drops the clients built on the old one.
+    """
+    def load():
+        c = Configuration()
+        c.assert_hostname = False
+        Configuration.set_default(c)
+        k8sconfig.load_incluster_config()
+        return k8sclient.ApiClient()
 
+    return _cached_api_client('kubernetes', load, fresh,
+                              K8S_API_CLIENTS if fresh else ())
 
-def get_storage_api_client():
-    load_k8s_config()
-    return k8sclient.StorageV1Api()
 
+def get_apps_api_client(fresh=False):
+    return _cached_api_client(
+        'apps', lambda: k8sclient.AppsV1Api(load_k8s_config(fresh)), fresh)
 
-def get_version_api_client():
-    load_k8s_config()
-    return k8sclient.VersionApi()
 
+def get_core_api_client(fresh=False):
+    return _cached_api_client(
+        'core', lambda: k8sclient.CoreV1Api(load_k8s_config(fresh)), fresh)
 
-def get_longhorn_api_client():
-    for i in range(RETRY_COUNTS):
-        try:
-            k8sconfig.load_incluster_config()
-            ips = get_mgr_ips()
 
-            # check if longhorn manager port is open before calling get_client
-            for ip in ips:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                mgr_port_open = sock.connect_ex((ip, 9500))
+def get_storage_api_client(fresh=False):
+    return _cached_api_client(
+        'storage', lambda: k8sclient.StorageV1Api(load_k8s_config(fresh)),
+        fresh)
 
-                if mgr_port_open == 0:
-                    client = get_client(ip + PORT)
-                    break
+
+def get_version_api_client(fresh=False):
+    return _cached_api_client(
+        'version', lambda: k8sclient.VersionApi(load_k8s_config(fresh)),
+        fresh)
+
+
+# Set by conftest.py's --balanced-client: get_longhorn_api_client() spreads
+# requests over all managers instead of using one.
+BALANCED_CLIENT = False
+
+
+def get_longhorn_api_client(fresh=False, addresses=None, balanced=None,
+                            **kw):
+    """
+    Return the session's Longhorn API client for the managers at
+    addresses, by default the manager pods found when first asked. The
+    client talks to the first of them that answers, or with balanced=True
+    (default BALANCED_CLIENT) spreads its requests over all of them with
+    get_balanced_client(). It is cached per set of addresses and checked
+    with one conditional schema request when it is fetched more than
+    LONGHORN_CLIENT_CHECK_INTERVAL seconds after its last check; if that
+    fails, or a manager a balanced client can't reach is no longer a
+    manager pod, the managers are looked up again and a new client is
+    built. fresh=True does so unconditionally. Addresses passed in become
+    the default for later calls. Clients built with extra
+    get_balanced_client() options are not cached.
+    """
+    for i in range(RETRY_COUNTS):
+        refresh = fresh or i > 0
+        try:
+            addrs = addresses
+            if addrs is None:
+                addrs = _cached_api_client(
+                    'longhorn-managers',
+                    lambda: [ip + PORT for ip in get_mgr_ips()], refresh)
+            else:
+                _cached_api_client('longhorn-managers', lambda: addrs, True)
+            if kw:
+                return get_balanced_client(addrs, **kw)
+            if balanced is None:
+                balanced = BALANCED_CLIENT
+            key = ('longhorn', balanced) + tuple(sorted(addrs))
+            with _api_clients_lock:
+                client = _api_clients.get(key)
+            if not refresh and client is not None:
+                checked = _longhorn_clients_checked.get(key, 0)
+                if time.time() - checked < LONGHORN_CLIENT_CHECK_INTERVAL:
+                    return client
+                if _longhorn_client_usable(client, addrs,
+                                           balanced and addresses is None):
+                    _longhorn_clients_checked[key] = time.time()
+                    return client
+                fresh = True
+                continue
+            if balanced:
+                client = _cached_api_client(
+                    key, lambda: get_balanced_client(addrs), True)
+            else:
+                client = _cached_api_client(
+                    key, lambda: _first_manager_client(addrs), True)
+            _longhorn_clients_checked[key] = time.time()
             return client
         except Exception:
             time.sleep(RETRY_INTERVAL)
 
 
+def _first_manager_client(addrs):
+    # Client for the first manager that answers; raises the last error if
+    # none does.
+    for i, address in enumerate(addrs):
+        try:
+            return get_client(address)
+        except Exception:
+            if i + 1 == len(addrs):
+                raise
+
+
+def _longhorn_client_usable(client, addrs, resolve):
+    try:
+        client.revalidate_schema()
+    except Exception:
+        return False
+    if not resolve:
+        return True
+    down = set(addrs) - set(longhorn.get_balanced_transport(addrs).healthy())
+    if not down:
+        return True
+    # Down managers that are still manager pods are expected back.
+    return down <= set(ip + PORT for ip in get_mgr_ips())
+
+
 def cleanup_volume(client, volume):
     """
     Clean up the volume after the test.
@@ -310,13 +461,12 @@ def create_and_check_volume(client, volume_name, num_of_replicas=3, size=SIZE,
 def wait_pod(pod_name):
     api = get_core_api_client()
 
-    for i in range(DEFAULT_POD_TIMEOUT):
-        pod = api.read_namespaced_pod(
-            name=pod_name,
-            namespace='default')
-        if pod.status.phase != 'Pending':
-            break
-        time.sleep(DEFAULT_POD_INTERVAL)
+    pod = wait_for_k8s_object(
+        api.list_namespaced_pod, pod_name,
+        lambda pod: pod is not None and pod.status.phase != 'Pending',
+        timeout=DEFAULT_POD_TIMEOUT * DEFAULT_POD_INTERVAL,
+        poll_interval=DEFAULT_POD_INTERVAL, name='wait_pod',
+        what='pod %s to start' % pod_name, namespace='default')
     assert pod.status.phase == 'Running'
 
 
@@ -618,17 +768,13 @@ def size_to_string(volume_size):
 
 
 def wait_delete_pod(api, pod_name):
-    for i in range(DEFAULT_POD_TIMEOUT):
-        ret = api.list_namespaced_pod(namespace='default')
-        found = False
-        for item in ret.items:
-            if item.metadata.name == pod_name:
-                found = True
-                break
-        if not found:
-            break
-        time.sleep(DEFAULT_POD_INTERVAL)
-    assert not found
+    wait_for_k8s_object(api.list_namespaced_pod, pod_name,
+                        lambda pod: pod is None,
+                        timeout=DEFAULT_POD_TIMEOUT * DEFAULT_POD_INTERVAL,
+                        poll_interval=DEFAULT_POD_INTERVAL,
+                        name='wait_delete_pod',
+                        what='pod %s to be deleted' % pod_name,
+                        namespace='default')
 
 
 def check_volume_replicas(volume, spec, tag_mapping):
@@ -750,33 +896,21 @@ def pod(request):
 @pytest.fixture
 def core_api(request):
     """
-    Create a new CoreV1API instance.
+    Return the session's CoreV1API instance.
     Returns:
-        A new CoreV1API Instance.
+        A CoreV1API Instance.
     """
-    c = Configuration()
-    c.assert_hostname = False
-    Configuration.set_default(c)
-    k8sconfig.load_incluster_config()
-    core_api = k8sclient.CoreV1Api()
-
-    return core_api
+    return get_core_api_client()
 
 
 @pytest.fixture
 def apps_api(request):
     """
-    Create a new AppsV1API instance.
+    Return the session's AppsV1API instance.
     Returns:
-        A new AppsV1API Instance.
+        An AppsV1API Instance.
     """
-    c = Configuration()
-    c.assert_hostname = False
-    Configuration.set_default(c)
-    k8sconfig.load_incluster_config()
-    apps_api = k8sclient.AppsV1Api()
-
-    return apps_api
+    return get_apps_api_client()
 
 
 @pytest.fixture
@@ -852,7 +986,7 @@ def pvc(request):
     }
 
     def finalizer():
-        api = k8sclient.CoreV1Api()
+        api = get_core_api_client()
 
         if not check_pvc_existence(api, pvc_manifest['metadata']['name']):
             return
@@ -1045,18 +1179,9 @@ def client(request):
     """
     Return an individual Longhorn API client for testing.
     """
-    k8sconfig.load_incluster_config()
     # Make sure nodes and managers are all online.
     ips = get_mgr_ips()
-
-    # check if longhorn manager port is open before calling get_client
-    for ip in ips:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        mgr_port_open = sock.connect_ex((ip, 9500))
-
-        if mgr_port_open == 0:
-            client = get_client(ip + PORT)
-            break
+    client = get_longhorn_api_client(addresses=[ip + PORT for ip in ips])
 
     hosts = client.list_node()
     assert len(hosts) == len(ips)
@@ -1070,7 +1195,6 @@ def client(request):
 
 @pytest.fixture
 def clients(request):
-    k8sconfig.load_incluster_config()
     ips = get_mgr_ips()
     client = get_client(ips[0] + PORT)
     hosts = client.list_node()
@@ -1087,49 +1211,141 @@ def clients(request):
     return clis
 
 
+def run_in_parallel(fn, items, max_workers=CLEANUP_WORKERS):
+    """
+    Call fn(item) for every item on a bounded thread pool and return the
+    results in order. The first error is re-raised once every call has
+    finished.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(max_workers, len(items))) as executor:
+        futures = [executor.submit(fn, item) for item in items]
+    return [f.result() for f in futures]
+
+
+def run_steps(steps, max_workers=CLEANUP_WORKERS):
+    """
+    Run a graph of steps on a bounded thread pool. steps maps a step name
+    to (fn, names of the steps it depends on); each fn() starts as soon as
+    all of its dependencies have finished. Steps that depend on a failed
+    step are skipped, and the first error is re-raised after everything
+    else has run.
+    """
+    pending = dict(steps)
+    done = set()
+    errors = []
+    failed = set()
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers) as executor:
+        while True:
+            changed = True
+            while changed:
+                changed = False
+                for name, (fn, deps) in list(pending.items()):
+                    if any(dep in failed for dep in deps):
+                        failed.add(name)
+                    elif all(dep in done for dep in deps):
+                        running[executor.submit(fn)] = name
+                    else:
+                        continue
+                    del pending[name]
+                    changed = True
+            if not running:
+                break
+
+            finished, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                if future.exception() is not None:
+                    failed.add(name)
+                    errors.append(future.exception())
+                else:
+                    done.add(name)
+
+    assert not pending, "unknown or circular dependencies: %s" % \
+        sorted(pending)
+    if errors:
+        raise errors[0]
+
+
 def cleanup_client():
+    """
+    Reset the cluster between tests. Volumes are deleted first, all at
+    once, and the disk and engine image steps that need them gone wait
+    for that; settings and each node are reset alongside.
+    """
     client = get_longhorn_api_client()
-    # cleanup test disks
-    cleanup_test_disks(client)
-
-    volumes = client.list_volume()
-    for v in volumes:
-        # ignore the error when clean up
-        try:
-            client.delete(v)
-        except Exception as e:
-            print("Exception when cleanup volume ", v, e)
-            pass
-    images = client.list_engine_image()
-    for img in images:
-        if not img.default:
-            # ignore the error when clean up
-            try:
-                client.delete(img)
-            except Exception as e:
-                print("Exception when cleanup image", img, e)
-                pass
+    host_id = get_self_host_id()
 
-    # enable nodes scheduling
-    reset_node(client)
-    reset_settings(client)
-    reset_disks_for_all_nodes(client)
-    reset_engine_image(client)
+    def check_replica_directory():
+        # check replica subdirectory of default disk path
+        if not os.path.exists(DEFAULT_REPLICA_DIRECTORY):
+            subprocess.check_call(
+                ["mkdir", "-p", DEFAULT_REPLICA_DIRECTORY])
+
+    steps = {
+        'volumes': (lambda: delete_all_volumes(client), []),
+        'test_disks': (lambda: cleanup_test_disks(client), ['volumes']),
+        'engine_images': (lambda: delete_engine_images(client),
+                          ['volumes']),
+        'engine_image': (lambda: reset_engine_image(client),
+                         ['engine_images']),
+        'settings': (lambda: reset_settings(client), []),
+        'replica_directory': (check_replica_directory, []),
+    }
+    for node in client.list_node():
+        deps = ['volumes']
+        if node.name == host_id:
+            deps.append('test_disks')
+        steps['node ' + node.name] = (
+            lambda node=node: reset_node_all(client, node), deps)
+    run_steps(steps)
 
-    # check replica subdirectory of default disk path
-    if not os.path.exists(DEFAULT_REPLICA_DIRECTORY):
-        subprocess.check_call(
-            ["mkdir", "-p", DEFAULT_REPLICA_DIRECTORY])
 
+def get_client(address, response_cache=None, coalescer=None):
+    """
+    Return a Longhorn API client for the manager at address. Clients for
+    the same address share one pooled, thread-safe HTTP transport.
 
-def get_client(address):
+    Pass a longhorn.ResponseCache to skip re-decoding unchanged GET
+    responses, or a longhorn.RequestCoalescer to share one GET between
+    threads asking for the same object at once. Objects from such a
+    client are shared between calls and must not be modified.
+    """
     url = 'http://' + address + '/v1/schemas'
-    c = longhorn.from_env(url=url)
+    c = longhorn.from_env(url=url,
+                          transport=longhorn.get_transport(address),
+                          response_cache=response_cache,
+                          coalescer=coalescer)
+    return c
+
+
+def get_balanced_client(addresses, response_cache=None, coalescer=None):
+    """
+    Return a Longhorn API client spreading its requests over the managers
+    at addresses. A manager that stops answering is skipped until it is
+    back, so the client keeps working while managers restart.
+
+    Reads are only kept on the manager that took a write for the thread
+    that made it, and only for a few seconds: other threads, and later
+    reads, may see another manager's older copy of the object.
+    """
+    url = 'http://' + addresses[0] + '/v1/schemas'
+    c = longhorn.from_env(url=url,
+                          transport=longhorn.get_balanced_transport(
+                              addresses),
+                          response_cache=response_cache,
+                          coalescer=coalescer)
     return c
 
 
 def get_mgr_ips():
-    ret = k8sclient.CoreV1Api().list_pod_for_all_namespaces(
+    ret = get_core_api_client().list_pod_for_all_namespaces(
             label_selector="app=longhorn-manager",
             watch=False)
     mgr_ips = []
@@ -1161,6 +1377,378 @@ def get_clients(hosts):
     return clients
 
 
+class WaitTimeout(AssertionError):
+    """
+    Raised by wait_until() when the condition does not hold before the
+    deadline or the abort check gives up early. It is an AssertionError,
+    like the asserts the waiters used to end with.
+    """
+
+    def __init__(self, name, what, waited, polls, last, reason=None):
+        self.name = name
+        self.waited = waited
+        self.polls = polls
+        self.last = last
+        self.reason = reason
+        if reason:
+            msg = 'gave up waiting for %s after %.1fs (%d polls): %s' % (
+                what, waited, polls, reason)
+        else:
+            msg = 'timed out waiting for %s after %.1fs (%d polls)' % (
+                what, waited, polls)
+        text = repr(last)
+        if len(text) > 1000:
+            text = text[:1000] + '...'
+        super(WaitTimeout, self).__init__(msg + '; last observed: ' + text)
+
+
+# Per waiter name: number of waits, polls, seconds waited and timeouts.
+WAIT_STATS = {}
+_wait_stats_lock = threading.Lock()
+
+
+def _record_wait(name, polls, waited, timed_out):
+    with _wait_stats_lock:
+        stats = WAIT_STATS.get(name)
+        if stats is None:
+            stats = WAIT_STATS[name] = {
+                'calls': 0, 'polls': 0, 'seconds': 0.0, 'timeouts': 0}
+        stats['calls'] += 1
+        stats['polls'] += polls
+        stats['seconds'] += waited
+        if timed_out:
+            stats['timeouts'] += 1
+
+
+def wait_until(fetch, predicate=bool, timeout=WAIT_TIMEOUT, name=None,
+               what=None, observe=None, abort=None,
+               interval=WAIT_INTERVAL_MIN, max_interval=WAIT_INTERVAL_MAX,
+               fetch_waits=False):
+    """
+    Call fetch() until predicate(value) is true and return that value.
+
+    The timeout counts the time between polls; the time spent in fetch()
+    is added to it, as the loops of RETRY_COUNTS polls this replaces spent
+    their API calls on top of their sleeps. When fetch() itself waits for
+    the next value, pass fetch_waits=True to count that time too. The first
+    polls come WAIT_INTERVAL_MIN apart and the gap grows by WAIT_BACKOFF up
+    to max_interval. abort(value) may return a reason to give up before
+    the deadline. On failure WaitTimeout carries observe(value) of the last
+    fetch. Polls and time spent are added to WAIT_STATS[name].
+    :param fetch: Callable returning the current value.
+    :param predicate: Callable returning True once the wait is over.
+    :param timeout: Seconds to wait before raising WaitTimeout.
+    :param name: The waiter name used in WAIT_STATS.
+    :param what: What is being waited for, for the failure message.
+    :param observe: Picks the part of the value worth reporting.
+    :param abort: Callable returning a reason to stop waiting, or None.
+    :param fetch_waits: Count the time spent in fetch() towards timeout.
+    :return: The first value that satisfied predicate.
+    """
+    if name is None:
+        name = getattr(fetch, '__name__', 'wait')
+    start = time.monotonic()
+    deadline = start + timeout
+    polls = 0
+    while True:
+        fetched = time.monotonic()
+        value = fetch()
+        polls += 1
+        if not fetch_waits:
+            deadline += time.monotonic() - fetched
+        if predicate(value):
+            _record_wait(name, polls, time.monotonic() - start, False)
+            return value
+
+        now = time.monotonic()
+        reason = abort(value) if abort is not None else None
+        if reason or now >= deadline:
+            _record_wait(name, polls, now - start, True)
+            last = value
+            if observe is not None:
+                try:
+                    last = observe(value)
+                except Exception:
+                    pass
+            raise WaitTimeout(name, what or name, now - start, polls, last,
+                              reason)
+
+        time.sleep(min(interval, deadline - now))
+        interval = min(interval * WAIT_BACKOFF, max_interval)
+
+
+# Tracked kinds and the API type listed for each.
+TRACKED_TYPES = {'volumes': 'volume', 'nodes': 'node'}
+
+
+class ClusterStateTracker(object):
+    """
+    Lists volumes and nodes once per tick on a background thread, so any
+    number of concurrent waiters cost one API call per kind and tick.
+
+    Waiters enter subscribe() with the kind they wait on. The first waiter
+    on a kind polls by id by itself; from the second one on, the waiters
+    after it share the thread, which lists only the kinds they wait on.
+    The thread runs while such a shared subscription exists. Each new one
+    brings the tick interval back to WAIT_INTERVAL_MIN; it then backs off
+    like wait_until() does.
+
+    Only a weak reference to the client is kept, and the listed objects
+    are dropped when the thread stops, so the tracker does not keep the
+    client alive.
+    """
+
+    def __init__(self, client, min_interval=WAIT_INTERVAL_MIN,
+                 max_interval=WAIT_INTERVAL_MAX):
+        self._client = weakref.ref(client)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stats = {'ticks': 0, 'snapshots': 0, 'subscriptions': 0}
+        self._cond = threading.Condition()
+        self._waiters = dict.fromkeys(TRACKED_TYPES, 0)
+        self._shared = dict.fromkeys(TRACKED_TYPES, 0)
+        self._reset = False
+        self._thread = None
+        self._started = dict.fromkeys(TRACKED_TYPES)
+        self._state = dict.fromkeys(TRACKED_TYPES)
+        self._error = dict.fromkeys(TRACKED_TYPES)
+
+    @contextlib.contextmanager
+    def subscribe(self, kind):
+        """
+        Register a waiter on kind. Yields True when the waiter should use
+        snapshot(), False when it is the only one and should poll itself.
+        """
+        with self._cond:
+            shared = self._waiters[kind] > 0
+            self._waiters[kind] += 1
+            if shared:
+                self._shared[kind] += 1
+                self.stats['subscriptions'] += 1
+                self._reset = True
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name='cluster-state-tracker')
+                    self._thread.daemon = True
+                    self._thread.start()
+                self._cond.notify_all()
+        try:
+            yield shared
+        finally:
+            with self._cond:
+                self._waiters[kind] -= 1
+                if shared:
+                    self._shared[kind] -= 1
+
+    def _run(self):
+        interval = self.min_interval
+        while True:
+            with self._cond:
+                kinds = [k for k, n in self._shared.items() if n > 0]
+                client = self._client()
+                if not kinds or client is None:
+                    # The listed objects refer to the client.
+                    self._state = dict.fromkeys(TRACKED_TYPES)
+                    self._error = dict.fromkeys(TRACKED_TYPES)
+                    self._thread = None
+                    return
+                if self._reset:
+                    self._reset = False
+                    interval = self.min_interval
+
+            started = time.monotonic()
+            listed = {}
+            for kind in kinds:
+                try:
+                    listed[kind] = (dict(
+                        (o.name, o)
+                        for o in client.iter_all(TRACKED_TYPES[kind])), None)
+                except Exception as e:
+                    listed[kind] = (None, e)
+            client = None
+
+            with self._cond:
+                self.stats['ticks'] += 1
+                for kind, (objs, error) in listed.items():
+                    self._started[kind] = started
+                    self._state[kind] = objs
+                    self._error[kind] = error
+                self._cond.notify_all()
+                if not self._reset:
+                    self._cond.wait(interval)
+            interval = min(interval * WAIT_BACKOFF, self.max_interval)
+
+    def snapshot(self, kind, timeout=WAIT_TIMEOUT):
+        """
+        Return the objects of kind by name from the first tick started
+        after this call, raising the tick's error if listing failed. Only
+        valid inside a subscribe(kind) that yielded True. The objects are
+        shared with the other waiters and must not be modified.
+        """
+        requested = time.monotonic()
+        deadline = requested + timeout
+        with self._cond:
+            assert self._shared[kind] > 0
+            while self._started[kind] is None or \
+                    self._started[kind] < requested:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise WaitTimeout('cluster state', 'a cluster state tick',
+                                      timeout, 0, None)
+                self._cond.wait(remaining)
+            self.stats['snapshots'] += 1
+            if self._error[kind] is not None:
+                raise self._error[kind]
+            return self._state[kind]
+
+
+_trackers = weakref.WeakKeyDictionary()
+_trackers_lock = threading.Lock()
+
+
+def get_cluster_state_tracker(client):
+    """
+    Return the ClusterStateTracker shared by all waiters on client.
+    """
+    with _trackers_lock:
+        tracker = _trackers.get(client)
+        if tracker is None:
+            tracker = _trackers[client] = ClusterStateTracker(client)
+        return tracker
+
+
+def wait_for_tracked(client, kind, names, predicate, **kw):
+    """
+    wait_until() over the shared cluster state of client. kind is
+    'volumes' or 'nodes'. predicate gets the named object, or None while it
+    does not exist; when names is a list it gets a list of those instead.
+    A waiter alone on kind polls by id instead of listing.
+    """
+    tracker = get_cluster_state_tracker(client)
+    obj_type = TRACKED_TYPES[kind]
+
+    def fetch_shared():
+        # Snapshots are shared by every waiter on kind; each one gets its
+        # own copy of the objects it asked for.
+        objs = tracker.snapshot(kind)
+        if isinstance(names, list):
+            return [copy.deepcopy(objs.get(name)) for name in names]
+        return copy.deepcopy(objs.get(names))
+
+    def fetch_own():
+        if isinstance(names, list):
+            objs = client.by_ids(obj_type, names)
+            return [objs[name] for name in names]
+        return client.by_id(obj_type, names)
+
+    with tracker.subscribe(kind) as shared:
+        if shared:
+            return wait_until(fetch_shared, predicate, interval=0,
+                              max_interval=0, fetch_waits=True, **kw)
+        return wait_until(fetch_own, predicate, **kw)
+
+
+def wait_for_k8s_object(list_fn, obj_name, predicate, timeout=WAIT_TIMEOUT,
+                        poll_interval=RETRY_INTERVAL, name=None, what=None,
+                        **list_kw):
+    """
+    Wait until predicate(obj) is true for the Kubernetes object obj_name,
+    where obj is None while the object does not exist. list_fn is the API's
+    list call for the kind, e.g. list_namespaced_pod, called with list_kw.
+
+    The object is listed once and then watched from that resourceVersion,
+    so the wait ends as soon as the matching event arrives. Watches that
+    end are resumed from the last resourceVersion seen, and re-listed if it
+    has expired (410 Gone). If watching fails for any other reason the rest
+    of the wait polls the list every poll_interval.
+    :return: The object that satisfied predicate, or None.
+    """
+    if name is None:
+        name = getattr(predicate, '__name__', 'wait_for_k8s_object')
+    what = what or obj_name
+    selector = 'metadata.name=' + obj_name
+    start = time.monotonic()
+    deadline = start + timeout
+    calls = [0]
+
+    def get():
+        calls[0] += 1
+        ret = list_fn(field_selector=selector, **list_kw)
+        obj = ret.items[0] if ret.items else None
+        return obj, ret.metadata.resource_version
+
+    def done(obj):
+        _record_wait(name, calls[0], time.monotonic() - start, False)
+        return obj
+
+    def timed_out(obj):
+        waited = time.monotonic() - start
+        _record_wait(name, calls[0], waited, True)
+        return WaitTimeout(name, what, waited, calls[0], obj)
+
+    obj, rv = get()
+    if predicate(obj):
+        return done(obj)
+
+    w = k8swatch.Watch()
+    watching = True
+    while watching:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise timed_out(obj)
+
+        seconds = max(1, int(min(remaining, K8S_WATCH_TIMEOUT)))
+        calls[0] += 1
+        events = w.stream(list_fn, field_selector=selector,
+                          resource_version=rv, timeout_seconds=seconds,
+                          _request_timeout=seconds + 5, **list_kw)
+        status = None
+        while True:
+            # Only errors from the watch itself end it; the predicate's
+            # are the caller's.
+            try:
+                event = next(events, None)
+            except ApiException as e:
+                status = e.status or 0
+                break
+            except urllib3.exceptions.HTTPError:
+                status = 0
+                break
+            if event is None:
+                break
+            if event['type'] == 'ERROR':
+                status = event['raw_object'].get('code') or 0
+                break
+            if event['type'] not in ('ADDED', 'MODIFIED', 'DELETED'):
+                continue
+            rv = event['object'].metadata.resource_version
+            obj = event['object']
+            if event['type'] == 'DELETED':
+                obj = None
+            if predicate(obj):
+                w.stop()
+                return done(obj)
+            if time.monotonic() >= deadline:
+                w.stop()
+
+        if status == 410:
+            obj, rv = get()
+            if predicate(obj):
+                return done(obj)
+        elif status is not None:
+            watching = False
+
+    # Watching is not available; poll for the rest of the wait.
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            raise timed_out(obj)
+        time.sleep(min(poll_interval, deadline - now))
+        obj, rv = get()
+        if predicate(obj):
+            return done(obj)
+
+
 def wait_scheduling_failure(client, volume_name):
     """
     Wait and make sure no new replicas are running on the specified
@@ -1168,22 +1756,18 @@ def wait_scheduling_failure(client, volume_name):
     :param client: The Longhorn client to use in the request.
     :param volume_name: The name of the volume.
     """
-    scheduling_failure = False
-    for i in range(RETRY_COUNTS):
-        v = client.by_id_volume(volume_name)
-        if v.conditions.scheduled.status == "False" and \
-                v.conditions.scheduled.reason == \
-                "ReplicaSchedulingFailure":
-            scheduling_failure = True
-        if scheduling_failure:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert scheduling_failure
+    def scheduling_failure(v):
+        return v.conditions.scheduled.status == "False" and \
+            v.conditions.scheduled.reason == "ReplicaSchedulingFailure"
+
+    wait_until(lambda: client.by_id_volume(volume_name), scheduling_failure,
+               name='wait_scheduling_failure',
+               what='volume %s replica scheduling failure' % volume_name,
+               observe=lambda v: v.conditions.scheduled)
 
 
 def wait_for_device_login(dest_path, name):
-    dev = ""
-    for i in range(RETRY_COUNTS):
+    def list_files():
         for j in range(RETRY_COMMAND_COUNT):
             files = []
             try:
@@ -1192,44 +1776,40 @@ def wait_for_device_login(dest_path, name):
             except Exception:
                 time.sleep(1)
         assert files
-        if name in files:
-            dev = name
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert dev == name
-    return dev
+        return files
+
+    wait_until(list_files, lambda files: name in files,
+               name='wait_for_device_login',
+               what='device %s in %s' % (name, dest_path))
+    return name
 
 
 def wait_for_replica_directory():
-    found = False
-    for i in range(RETRY_COUNTS):
-        if os.path.exists(DEFAULT_REPLICA_DIRECTORY):
-            found = True
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert found
+    wait_until(lambda: os.path.exists(DEFAULT_REPLICA_DIRECTORY),
+               name='wait_for_replica_directory',
+               what=DEFAULT_REPLICA_DIRECTORY)
+
+
+def _find_by_name(objs, name):
+    for obj in objs:
+        if obj.name == name:
+            return obj
+    return None
 
 
 def wait_for_volume_creation(client, name):
-    for i in range(RETRY_COUNTS):
-        volumes = client.list_volume()
-        found = False
-        for volume in volumes:
-            if volume.name == name:
-                found = True
-                break
-        if found:
-            break
-    assert found
+    wait_for_tracked(client, 'volumes', name, lambda v: v is not None,
+                     name='wait_for_volume_creation',
+                     what='volume %s to be created' % name)
 
 
 def wait_for_volume_endpoint(client, name):
-    for i in range(RETRY_COUNTS):
-        v = client.by_id_volume(name)
-        engine = get_volume_engine(v)
-        if engine.endpoint != "":
-            break
-        time.sleep(RETRY_INTERVAL)
+    v = wait_for_tracked(client, 'volumes', name,
+                         lambda v: v is not None and
+                         get_volume_engine(v).endpoint != "",
+                         name='wait_for_volume_endpoint',
+                         what='volume %s endpoint' % name,
+                         observe=lambda v: v.controllers)
     check_volume_endpoint(v)
     return v
 
@@ -1293,71 +1873,69 @@ def wait_for_volume_faulted(client, name):
 
 
 def wait_for_volume_status(client, name, key, value):
-    wait_for_volume_creation(client, name)
-    for i in range(RETRY_COUNTS):
-        volume = client.by_id_volume(name)
-        if volume[key] == value:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert volume[key] == value
-    return volume
+    return wait_for_tracked(client, 'volumes', name,
+                            lambda v: v is not None and v[key] == value,
+                            name='wait_for_volume_status',
+                            what='volume %s %s == %r' % (name, key, value),
+                            observe=lambda v: v[key])
+
+
+def wait_for_volumes_status(client, names, key, value):
+    """
+    Wait until volume[key] == value for every volume in names. Each round
+    checks all of the volumes in one shared cluster state listing.
+    :param client: The Longhorn client to use in the request.
+    :param names: The names of the volumes.
+    :return: The volumes, in the same order as names.
+    """
+    return wait_for_tracked(client, 'volumes', list(names),
+                            lambda volumes: all(v is not None and
+                                                v[key] == value
+                                                for v in volumes),
+                            name='wait_for_volumes_status',
+                            what='volumes %s %s == %r' % (', '.join(names),
+                                                          key, value),
+                            observe=lambda volumes: dict(
+                                (n, v and v[key])
+                                for n, v in zip(names, volumes)))
 
 
 def wait_for_volume_delete(client, name):
-    for i in range(RETRY_COUNTS):
-        volumes = client.list_volume()
-        found = False
-        for volume in volumes:
-            if volume.name == name:
-                found = True
-                break
-        if not found:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert not found
+    wait_for_tracked(client, 'volumes', name, lambda v: v is None,
+                     name='wait_for_volume_delete',
+                     what='volume %s to be deleted' % name,
+                     observe=lambda v: v.state)
 
 
 def wait_for_backup_volume_delete(client, name):
-    for i in range(RETRY_COUNTS):
-        bvs = client.list_backupVolume()
-        found = False
-        for bv in bvs:
-            if bv.name == name:
-                found = True
-                break
-        if not found:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert not found
+    wait_until(lambda: _find_by_name(client.iter_list('backupVolume'), name),
+               lambda bv: bv is None,
+               name='wait_for_backup_volume_delete',
+               what='backup volume %s to be deleted' % name)
 
 
 def wait_for_volume_current_image(client, name, image):
-    wait_for_volume_creation(client, name)
-    for i in range(RETRY_COUNTS):
-        volume = client.by_id_volume(name)
-        if volume.currentImage == image:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert volume.currentImage == image
-    return volume
+    return wait_for_tracked(client, 'volumes', name,
+                            lambda v: v is not None and
+                            v.currentImage == image,
+                            name='wait_for_volume_current_image',
+                            what='volume %s currentImage == %s' % (
+                                name, image),
+                            observe=lambda v: v.currentImage)
 
 
 def wait_for_volume_replica_count(client, name, count):
-    wait_for_volume_creation(client, name)
-    for i in range(RETRY_COUNTS):
-        volume = client.by_id_volume(name)
-        if len(volume.replicas) == count:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert len(volume.replicas) == count
-    return volume
+    return wait_for_tracked(client, 'volumes', name,
+                            lambda v: v is not None and
+                            len(v.replicas) == count,
+                            name='wait_for_volume_replica_count',
+                            what='volume %s to have %d replicas' % (name,
+                                                                    count),
+                            observe=lambda v: [r.name for r in v.replicas])
 
 
 def wait_for_volume_replicas_mode(client, volname, mode, replicas_name=None):
-    verified = False
-    for i in range(RETRY_COUNTS):
-        volume = client.by_id_volume(volname)
-        count = 0
+    def verified(volume):
         replicas = []
         if replicas_name is None:
             replicas = volume.replicas
@@ -1369,27 +1947,21 @@ def wait_for_volume_replicas_mode(client, volname, mode, replicas_name=None):
                         replicas.append(r)
                         found = True
                 assert found
-        for r in replicas:
-            if r.mode == mode:
-                count += 1
-        if count == len(replicas):
-            verified = True
-            break
-        time.sleep(RETRY_INTERVAL)
+        return all(r.mode == mode for r in replicas)
 
-    assert verified
-    return volume
+    return wait_until(lambda: client.by_id_volume(volname), verified,
+                      name='wait_for_volume_replicas_mode',
+                      what='volume %s replicas in mode %s' % (volname, mode),
+                      observe=lambda v: dict((r.name, r.mode)
+                                             for r in v.replicas))
 
 
 def wait_for_snapshot_purge(client, volume_name, *snaps):
-    completed = 0
     last_purge_progress = {}
-    purge_status = {}
-    for i in range(RETRY_COUNTS):
+
+    def completed(v):
         completed = 0
-        v = client.by_id_volume(volume_name)
-        purge_status = v.purgeStatus
-        for status in purge_status:
+        for status in v.purgeStatus:
             assert status.error == ""
 
             progress = status.progress
@@ -1401,10 +1973,12 @@ def wait_for_snapshot_purge(client, volume_name, *snaps):
             if status.state == "complete":
                 assert progress == 100
                 completed += 1
-        if completed == len(purge_status):
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert completed == len(purge_status)
+        return completed == len(v.purgeStatus)
+
+    v = wait_until(lambda: client.by_id_volume(volume_name), completed,
+                   name='wait_for_snapshot_purge',
+                   what='volume %s snapshot purge' % volume_name,
+                   observe=lambda v: v.purgeStatus)
 
     # Now that the purge has been reported to be completed, the Snapshots
     # should should be removed or "marked as removed" in the case of
@@ -1427,37 +2001,31 @@ def wait_for_snapshot_purge(client, volume_name, *snaps):
 
 
 def wait_for_engine_image_creation(client, image_name):
-    for i in range(RETRY_COUNTS):
-        images = client.list_engine_image()
-        found = False
-        for img in images:
-            if img.name == image_name:
-                found = True
-                break
-        if found:
-            break
-    assert found
+    wait_until(lambda: _find_by_name(client.iter_all('engineImage'),
+                                     image_name),
+               lambda img: img is not None,
+               name='wait_for_engine_image_creation',
+               what='engine image %s to be created' % image_name)
 
 
 def wait_for_engine_image_state(client, image_name, state):
     wait_for_engine_image_creation(client, image_name)
-    for i in range(RETRY_COUNTS):
-        image = client.by_id_engine_image(image_name)
-        if image.state == state:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert image.state == state
-    return image
+    return wait_until(lambda: client.by_id_engine_image(image_name),
+                      lambda img: img.state == state,
+                      name='wait_for_engine_image_state',
+                      what='engine image %s state == %s' % (image_name,
+                                                            state),
+                      observe=lambda img: img.state)
 
 
 def wait_for_engine_image_ref_count(client, image_name, count):
     wait_for_engine_image_creation(client, image_name)
-    for i in range(RETRY_COUNTS):
-        image = client.by_id_engine_image(image_name)
-        if image.refCount == count:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert image.refCount == count
+    image = wait_until(lambda: client.by_id_engine_image(image_name),
+                       lambda img: img.refCount == count,
+                       name='wait_for_engine_image_ref_count',
+                       what='engine image %s refCount == %d' % (image_name,
+                                                                count),
+                       observe=lambda img: img.refCount)
     if count == 0:
         assert image.noRefSince != ""
     return image
@@ -1512,26 +2080,25 @@ def crash_replica_processes(client, api, volname, replicas=None):
 
 
 def wait_for_replica_failed(client, volname, replica_name):
-    failed = True
-    for i in range(RETRY_COUNTS):
-        time.sleep(RETRY_INTERVAL)
-        failed = True
-        volume = client.by_id_volume(volname)
+    def failed(volume):
         for r in volume.replicas:
             if r['name'] != replica_name:
                 continue
             if r['running'] or r['failedAt'] == "":
-                failed = False
-                break
+                return False
             if r['instanceManagerName'] != "":
                 im = client.by_id_instance_manager(
                     r['instanceManagerName'])
                 if r['name'] in im['instances']:
-                    failed = False
-                    break
-        if failed:
-            break
-    assert failed
+                    return False
+        return True
+
+    wait_until(lambda: client.by_id_volume(volname), failed,
+               name='wait_for_replica_failed',
+               what='replica %s of volume %s to fail' % (replica_name,
+                                                         volname),
+               observe=lambda v: [r for r in v.replicas
+                                  if r['name'] == replica_name])
 
 
 @pytest.fixture
@@ -1829,20 +2396,20 @@ def cleanup_host_disk(vol_name):
 
 
 def wait_for_volume_condition_scheduled(client, name, key, value):
-    wait_for_volume_creation(client, name)
-    for i in range(RETRY_COUNTS):
-        volume = client.by_id_volume(name)
+    def scheduled(volume):
         conditions = volume.conditions
-        if conditions is not None and \
-                conditions != {} and \
-                conditions[VOLUME_CONDITION_SCHEDULED] and \
-                conditions[VOLUME_CONDITION_SCHEDULED][key] and \
-                conditions[VOLUME_CONDITION_SCHEDULED][key] == value:
-            break
-        time.sleep(RETRY_INTERVAL)
-    conditions = volume.conditions
-    assert conditions[VOLUME_CONDITION_SCHEDULED][key] == value
-    return volume
+        return conditions is not None and \
+            conditions != {} and \
+            conditions[VOLUME_CONDITION_SCHEDULED] and \
+            conditions[VOLUME_CONDITION_SCHEDULED][key] and \
+            conditions[VOLUME_CONDITION_SCHEDULED][key] == value
+
+    return wait_for_tracked(client, 'volumes', name,
+                            lambda v: v is not None and scheduled(v),
+                            name='wait_for_volume_condition_scheduled',
+                            what='volume %s scheduled condition %s == %r' % (
+                                name, key, value),
+                            observe=lambda v: v.conditions)
 
 
 def get_host_disk_size(disk):
@@ -1863,104 +2430,87 @@ def get_host_disk_size(disk):
 def wait_for_disk_status(client, node_name, disk_name, key, value):
     # use wait_for_disk_storage_available to check storageAvailable
     assert key != "storageAvailable"
-    for i in range(RETRY_COUNTS):
-        node = client.by_id_node(node_name)
-        disks = node.disks
-        if len(disks) > 0 and \
-                disk_name in disks and \
-                disks[disk_name][key] == value:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert len(disks) != 0
-    assert disk_name in disks
-    assert disks[disk_name][key] == value
-    return node
+    return wait_for_tracked(client, 'nodes', node_name,
+                            lambda node: disk_name in node.disks and
+                            node.disks[disk_name][key] == value,
+                            name='wait_for_disk_status',
+                            what='node %s disk %s %s == %r' % (
+                                node_name, disk_name, key, value),
+                            observe=lambda node: node.disks[disk_name][key])
 
 
 def wait_for_disk_storage_available(client, node_name, disk_name, disk_path):
-    for i in range(RETRY_COUNTS):
-        node = client.by_id_node(node_name)
-        disks = node.disks
-        if len(disks) > 0 and disk_name in disks:
-            free, _ = get_host_disk_size(disk_path)
-            if disks[disk_name]["storageAvailable"] == free:
-                break
-        time.sleep(RETRY_INTERVAL)
-    assert len(disks) != 0
-    assert disk_name in disks
-    assert disks[disk_name]["storageAvailable"] == free
-    return node
+    def available(node):
+        if disk_name not in node.disks:
+            return False
+        free, _ = get_host_disk_size(disk_path)
+        return node.disks[disk_name]["storageAvailable"] == free
+
+    return wait_until(lambda: client.by_id_node(node_name), available,
+                      name='wait_for_disk_storage_available',
+                      what='node %s disk %s storageAvailable to match %s' % (
+                          node_name, disk_name, disk_path),
+                      observe=lambda node:
+                      node.disks[disk_name]["storageAvailable"])
 
 
 def wait_for_disk_uuid(client, node_name, uuid):
-    found = False
-    for i in range(RETRY_COUNTS):
-        node = client.by_id_node(node_name)
-        disks = node.disks
-        for name in disks:
-            if disks[name]["diskUUID"] == uuid:
-                found = True
-                break
-        if found:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert found
-    return node
+    return wait_until(lambda: client.by_id_node(node_name),
+                      lambda node: any(d["diskUUID"] == uuid
+                                       for d in node.disks.values()),
+                      name='wait_for_disk_uuid',
+                      what='node %s disk with UUID %s' % (node_name, uuid),
+                      observe=lambda node: dict(
+                          (n, d["diskUUID"]) for n, d in node.disks.items()))
 
 
 def wait_for_disk_conditions(client, node_name, disk_name, key, value):
-    for i in range(RETRY_COUNTS):
-        node = client.by_id_node(node_name)
-        disks = node.disks
-        disk = disks[disk_name]
-        conditions = disk.conditions
-        if conditions[key]["status"] == value:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert conditions[key]["status"] == value
-    return node
+    return wait_until(lambda: client.by_id_node(node_name),
+                      lambda node: node.disks[disk_name].conditions[key]
+                      ["status"] == value,
+                      name='wait_for_disk_conditions',
+                      what='node %s disk %s condition %s == %r' % (
+                          node_name, disk_name, key, value),
+                      observe=lambda node:
+                      node.disks[disk_name].conditions[key])
 
 
 def wait_for_node_update(client, name, key, value):
-    for i in range(RETRY_COUNTS):
-        node = client.by_id_node(name)
-        if str(node[key]) == str(value):
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert str(node[key]) == str(value)
-    return node
+    return wait_for_tracked(client, 'nodes', name,
+                            lambda node: str(node[key]) == str(value),
+                            name='wait_for_node_update',
+                            what='node %s %s == %r' % (name, key, value),
+                            observe=lambda node: node[key])
 
 
 def wait_for_disk_update(client, name, disk_num):
-    for i in range(RETRY_COUNTS):
+    try:
+        return wait_until(lambda: client.by_id_node(name),
+                          lambda node: len(node.disks) == disk_num and
+                          all(d["diskUUID"] != ""
+                              for d in node.disks.values()),
+                          name='wait_for_disk_update',
+                          what='node %s to have %d disks with UUIDs' % (
+                              name, disk_num),
+                          observe=lambda node: node.disks)
+    except WaitTimeout:
+        # Disks on invalid or unmounted paths never get a UUID; only the
+        # disk count has to be right.
         node = client.by_id_node(name)
-        if len(node.disks) == disk_num:
-            allUpdated = True
-            disks = node.disks
-            for d in disks:
-                if disks[d]["diskUUID"] == "":
-                    allUpdated = False
-                    break
-            if allUpdated:
-                break
-        time.sleep(RETRY_INTERVAL)
-    assert len(node.disks) == disk_num
-    return node
+        assert len(node.disks) == disk_num
+        return node
 
 
 def wait_for_node_tag_update(client, name, tags):
-    updated = False
-    for i in range(RETRY_COUNTS):
-        node = client.by_id_node(name)
+    def updated(node):
         if not tags and not node.tags:
-            updated = True
-            break
-        elif node.tags is not None and set(node.tags) == set(tags):
-            updated = True
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert updated
-    return node
+            return True
+        return node.tags is not None and set(node.tags) == set(tags)
+
+    return wait_for_tracked(client, 'nodes', name, updated,
+                            name='wait_for_node_tag_update',
+                            what='node %s tags == %s' % (name, tags),
+                            observe=lambda node: node.tags)
 
 
 def cleanup_node_disks(client, node_name):
@@ -2012,72 +2562,71 @@ def get_volume_attached_nodes(v):
 
 
 def wait_for_backup_completion(client, volume_name, snapshot_name):
-    completed = False
-    for i in range(RETRY_BACKUP_COUNTS):
-        v = client.by_id_volume(volume_name)
+    def completed(v):
         for b in v.backupStatus:
-            assert b.error == ""
             if b.snapshot == snapshot_name and b.state == "complete":
                 assert b.progress == 100
-                completed = True
-                break
-        if completed:
-            break
-        time.sleep(RETRY_BACKUP_INTERVAL)
-    assert completed is True
-    return v
+                return True
+        return False
+
+    def failed(v):
+        for b in v.backupStatus:
+            if b.error != "":
+                return 'backup of %s failed: %s' % (b.snapshot, b.error)
+        return None
+
+    return wait_until(lambda: client.by_id_volume(volume_name), completed,
+                      timeout=WAIT_BACKUP_TIMEOUT,
+                      name='wait_for_backup_completion',
+                      what='backup of volume %s snapshot %s' % (
+                          volume_name, snapshot_name),
+                      observe=lambda v: v.backupStatus, abort=failed)
 
 
 def monitor_restore_progress(client, volume_name):
-    completed = 0
-    rs = {}
-    for i in range(RETRY_COUNTS):
+    def completed(v):
+        if v is None:
+            return False
         completed = 0
-        v = client.by_id_volume(volume_name)
-        rs = v.restoreStatus
-        for r in rs:
-            assert r.error == ""
+        for r in v.restoreStatus:
             if r.state == "complete":
                 assert r.progress == 100
                 completed += 1
-        if completed == len(rs):
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert completed == len(rs)
-    return v
+        return completed == len(v.restoreStatus)
+
+    def failed(v):
+        if v is None:
+            return None
+        for r in v.restoreStatus:
+            if r.error != "":
+                return 'restore on %s failed: %s' % (r.replica, r.error)
+        return None
+
+    return wait_for_tracked(client, 'volumes', volume_name, completed,
+                            name='monitor_restore_progress',
+                            what='volume %s restoration' % volume_name,
+                            observe=lambda v: v.restoreStatus, abort=failed)
 
 
 def wait_for_volume_migration_ready(client, volume_name):
-    for i in range(RETRY_COUNTS):
-        v = client.by_id_volume(volume_name)
-        engines = v.controllers
-        ready = True
-        if len(engines) == 2:
-            for e in v.controllers:
-                if e.endpoint == "":
-                    ready = False
-                    break
-        else:
-            ready = False
-        if ready:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert ready
-    return v
+    return wait_until(lambda: client.by_id_volume(volume_name),
+                      lambda v: len(v.controllers) == 2 and
+                      all(e.endpoint != "" for e in v.controllers),
+                      name='wait_for_volume_migration_ready',
+                      what='volume %s migration engines' % volume_name,
+                      observe=lambda v: v.controllers)
 
 
 def wait_for_volume_migration_node(client, volume_name, node_id):
-    for i in range(RETRY_COUNTS):
-        v = client.by_id_volume(volume_name)
-        engines = v.controllers
-        replicas = v.replicas
-        if len(engines) == 1 and len(replicas) == v.numberOfReplicas:
-            e = engines[0]
-            if e.endpoint != "":
-                break
-        time.sleep(RETRY_INTERVAL)
-    assert e.hostId == node_id
-    assert e.endpoint != ""
+    v = wait_until(lambda: client.by_id_volume(volume_name),
+                   lambda v: len(v.controllers) == 1 and
+                   len(v.replicas) == v.numberOfReplicas and
+                   v.controllers[0].endpoint != "",
+                   name='wait_for_volume_migration_node',
+                   what='volume %s migration to node %s' % (volume_name,
+                                                            node_id),
+                   observe=lambda v: v.controllers)
+    assert v.controllers[0].hostId == node_id
     return v
 
 
@@ -2094,17 +2643,152 @@ def get_update_disks(disks):
     return update_disk
 
 
-def reset_node(client):
-    nodes = client.list_node()
-    for node in nodes:
+def delete_all_volumes(client):
+    """
+    Delete every volume concurrently, then wait in one wait for the ones
+    whose delete succeeded to be gone.
+    """
+    volumes = list(client.iter_all('volume'))
+
+    def delete(v):
+        # ignore the error when clean up
+        try:
+            client.delete(v)
+        except Exception as e:
+            print("Exception when cleanup volume ", v, e)
+            return False
+        return True
+
+    deleted = run_in_parallel(delete, volumes)
+    names = [v.name for v, ok in zip(volumes, deleted) if ok]
+    if names:
+        wait_for_tracked(client, 'volumes', names,
+                         lambda volumes: all(v is None for v in volumes),
+                         name='delete_all_volumes',
+                         what='volumes %s to be deleted' % ', '.join(names),
+                         observe=lambda volumes: [v.name for v in volumes
+                                                  if v is not None])
+
+
+def delete_engine_images(client):
+    """
+    Delete every non-default engine image concurrently, then wait in one
+    wait for the ones whose delete succeeded, and their pods, to be gone.
+    """
+    images = [img for img in client.iter_all('engineImage')
+              if not img.default]
+
+    def delete(img):
+        # ignore the error when clean up
         try:
-            node = client.update(node, tags=[])
-            node = wait_for_node_tag_update(client, node.id, [])
-            node = client.update(node, allowScheduling=True)
-            wait_for_node_update(client, node.id,
-                                 "allowScheduling", True)
+            client.delete(img)
         except Exception as e:
-            print("Exception when reset node schedulding and tags", node, e)
+            print("Exception when cleanup image", img, e)
+            return False
+        return True
+
+    deleted = run_in_parallel(delete, images)
+    names = set(img.name for img, ok in zip(images, deleted) if ok)
+    if not names:
+        return
+
+    core_api = get_core_api_client()
+
+    def remaining():
+        left = [ei.name for ei in client.iter_all('engineImage')
+                if ei.name in names]
+        pods = core_api.list_namespaced_pod(
+            LONGHORN_NAMESPACE,
+            label_selector="longhorn.io/component=engine-image").items
+        for pod in pods:
+            labels = pod.metadata.labels or {}
+            if labels.get("longhorn.io/engine-image") in names:
+                left.append(pod.metadata.name)
+        return left
+
+    wait_until(remaining, lambda left: not left,
+               name='delete_engine_images',
+               what='engine images %s and their pods to be deleted' %
+               ', '.join(sorted(names)))
+
+
+def state_fingerprint(state):
+    """
+    Short hash of a JSON-able description of cluster state, for telling
+    whether a reset step has anything to do.
+    """
+    text = json.dumps(state, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def settings_fingerprint(settings):
+    return state_fingerprint(dict(
+        (name, settings[name].value if name in settings else None)
+        for name in RESET_SETTINGS))
+
+
+def node_fingerprint(node):
+    return state_fingerprint({
+        'tags': sorted(node.tags or []),
+        'allowScheduling': node.allowScheduling,
+    })
+
+
+def disks_fingerprint(node):
+    disks = {}
+    for name, disk in iter(node.disks.items()):
+        disks[name] = {
+            'path': disk.path,
+            'allowScheduling': disk.allowScheduling,
+            'storageMaximum': disk.storageMaximum,
+            'storageReserved': disk.storageReserved,
+            'storageScheduled': disk.storageScheduled,
+            'tags': sorted(disk.tags or []),
+        }
+    return state_fingerprint(disks)
+
+
+RESET_SETTINGS_FINGERPRINT = state_fingerprint(RESET_SETTINGS)
+RESET_NODE_FINGERPRINT = state_fingerprint({'tags': [],
+                                            'allowScheduling': True})
+
+# Disk fingerprint of each node right after its last reset.
+_disk_baselines = {}
+
+# Per reset step: how many times it ran and how many it was skipped.
+RESET_STATS = {}
+_reset_stats_lock = threading.Lock()
+
+
+def _record_reset(step, skipped):
+    with _reset_stats_lock:
+        stats = RESET_STATS.setdefault(step, {'run': 0, 'skipped': 0})
+        stats['skipped' if skipped else 'run'] += 1
+    return skipped
+
+
+def reset_node_scheduling(client, node):
+    if _record_reset('node', node_fingerprint(node) ==
+                     RESET_NODE_FINGERPRINT):
+        return
+    try:
+        node = client.update(node, tags=[])
+        node = wait_for_node_tag_update(client, node.id, [])
+        node = client.update(node, allowScheduling=True)
+        wait_for_node_update(client, node.id,
+                             "allowScheduling", True)
+    except Exception as e:
+        print("Exception when reset node schedulding and tags", node, e)
+
+
+def reset_node(client):
+    run_in_parallel(lambda node: reset_node_scheduling(client, node),
+                    client.list_node())
+
+
+def reset_node_all(client, node):
+    reset_node_scheduling(client, node)
+    reset_node_disks(client, client.by_id_node(node.name))
 
 
 def cleanup_test_disks(client):
@@ -2112,6 +2796,11 @@ def cleanup_test_disks(client):
     host_id = get_self_host_id()
     node = client.by_id_node(host_id)
     disks = node.disks
+    # Nothing to delete: no test disk directories and no disks that the
+    # deletion below would drop.
+    if _record_reset('test_disks', not del_dirs and all(
+            disk.allowScheduling for disk in disks.values())):
+        return
     for name, disk in iter(disks.items()):
         for del_dir in del_dirs:
             dir_path = os.path.join(DIRECTORY_PATH, del_dir)
@@ -2152,39 +2841,52 @@ def cleanup_test_disks(client):
             pass
 
 
-def reset_disks_for_all_nodes(client):  # NOQA
-    nodes = client.list_node()
-    for node in nodes:
-        if len(node.disks) == 0:
-            default_disk = {"default-disk":
-                            {"path": DEFAULT_DISK_PATH,
-                             "allowScheduling": True}}
-            node = node.diskUpdate(disks=default_disk)
-            node = wait_for_disk_update(client, node.name, 1)
-            assert len(node.disks) == 1
-        # wait for node controller to update disk status
-        disks = node.disks
-        update_disks = {}
-        for name, disk in iter(disks.items()):
-            update_disk = disk
-            update_disk.allowScheduling = True
-            update_disk.storageReserved = \
-                int(update_disk.storageMaximum * 30 / 100)
-            update_disk.tags = []
-            update_disks[name] = update_disk
-        node = node.diskUpdate(disks=update_disks)
-        for name, disk in iter(node.disks.items()):
-            # wait for node controller update disk status
-            wait_for_disk_status(client, node.name, name,
-                                 "allowScheduling", True)
-            wait_for_disk_status(client, node.name, name,
-                                 "storageScheduled", 0)
-            wait_for_disk_status(client, node.name, name,
-                                 "storageReserved",
-                                 int(update_disk.storageMaximum * 30 / 100))
+def reset_node_disks(client, node):  # NOQA
+    if _record_reset('disks', disks_fingerprint(node) ==
+                     _disk_baselines.get(node.name)):
+        return
+    if len(node.disks) == 0:
+        default_disk = {"default-disk":
+                        {"path": DEFAULT_DISK_PATH,
+                         "allowScheduling": True}}
+        node = node.diskUpdate(disks=default_disk)
+        node = wait_for_disk_update(client, node.name, 1)
+        assert len(node.disks) == 1
+    # wait for node controller to update disk status
+    disks = node.disks
+    update_disks = {}
+    for name, disk in iter(disks.items()):
+        update_disk = disk
+        update_disk.allowScheduling = True
+        update_disk.storageReserved = \
+            int(update_disk.storageMaximum * 30 / 100)
+        update_disk.tags = []
+        update_disks[name] = update_disk
+    node = node.diskUpdate(disks=update_disks)
+    for name, disk in iter(node.disks.items()):
+        # wait for node controller update disk status
+        wait_for_disk_status(client, node.name, name,
+                             "allowScheduling", True)
+        wait_for_disk_status(client, node.name, name,
+                             "storageScheduled", 0)
+        wait_for_disk_status(client, node.name, name,
+                             "storageReserved",
+                             int(update_disk.storageMaximum * 30 / 100))
+    _disk_baselines[node.name] = disks_fingerprint(
+        client.by_id_node(node.name))
+
+
+def reset_disks_for_all_nodes(client):
+    run_in_parallel(lambda node: reset_node_disks(client, node),
+                    client.list_node())
 
 
 def reset_settings(client):
+    settings = dict((s.name, s) for s in client.iter_all('setting'))
+    if _record_reset('settings', settings_fingerprint(settings) ==
+                     RESET_SETTINGS_FINGERPRINT):
+        return
+
     minimal_setting = client.by_id_setting(
         SETTING_STORAGE_MINIMAL_AVAILABLE_PERCENTAGE)
     try:
@@ -2249,21 +2951,25 @@ def reset_engine_image(client):
 
 
 def wait_for_node_mountpropagation_condition(client, name):
-    for i in range(RETRY_COUNTS):
-        node = client.by_id_node(name)
+    def known(node):
         conditions = {}
         if "conditions" in node.keys():
             conditions = node.conditions
 
-        if NODE_CONDITION_MOUNTPROPAGATION in \
-                conditions.keys() and \
-                "status" in \
-                conditions[NODE_CONDITION_MOUNTPROPAGATION].keys() \
-                and conditions[NODE_CONDITION_MOUNTPROPAGATION]["status"] != \
-                CONDITION_STATUS_UNKNOWN:
-            break
-        time.sleep(RETRY_INTERVAL)
-    return node
+        return NODE_CONDITION_MOUNTPROPAGATION in \
+            conditions.keys() and \
+            "status" in \
+            conditions[NODE_CONDITION_MOUNTPROPAGATION].keys() \
+            and conditions[NODE_CONDITION_MOUNTPROPAGATION]["status"] != \
+            CONDITION_STATUS_UNKNOWN
+
+    # The condition may never be reported; callers check the node.
+    try:
+        return wait_until(lambda: client.by_id_node(name), known,
+                          name='wait_for_node_mountpropagation_condition',
+                          what='node %s mount propagation condition' % name)
+    except WaitTimeout as e:
+        return e.last
 
 
 class timeout:
@@ -2294,8 +3000,7 @@ def is_backupTarget_nfs(s):
 def find_backup(client, vol_name, snap_name):
     found = False
     for i in range(100):
-        bvs = client.list_backupVolume()
-        for bv in bvs:
+        for bv in client.iter_all('backupVolume'):
             if bv.name == vol_name:
                 found = True
                 break
@@ -2445,15 +3150,16 @@ def create_and_wait_statefulset(statefulset_manifest):
 
 def wait_statefulset(statefulset_manifest):
     api = get_apps_api_client()
+    name = statefulset_manifest['metadata']['name']
     replicas = statefulset_manifest['spec']['replicas']
-    for i in range(DEFAULT_STATEFULSET_TIMEOUT):
-        s_set = api.read_namespaced_stateful_set(
-            name=statefulset_manifest['metadata']['name'],
-            namespace='default')
-        if s_set.status.ready_replicas == replicas:
-            break
-        time.sleep(DEFAULT_STATEFULSET_INTERVAL)
-    assert s_set.status.ready_replicas == replicas
+    wait_for_k8s_object(
+        api.list_namespaced_stateful_set, name,
+        lambda s_set: s_set is not None and
+        s_set.status.ready_replicas == replicas,
+        timeout=DEFAULT_STATEFULSET_TIMEOUT * DEFAULT_STATEFULSET_INTERVAL,
+        poll_interval=DEFAULT_STATEFULSET_INTERVAL, name='wait_statefulset',
+        what='statefulset %s to have %d ready replicas' % (name, replicas),
+        namespace='default')
 
 
 def create_storage_class(sc_manifest):
@@ -2491,8 +3197,7 @@ def update_statefulset_manifests(ss_manifest, sc_manifest, name):
 
 
 def check_volume_existence(client, volume_name):
-    volumes = client.list_volume()
-    for volume in volumes:
+    for volume in client.iter_all('volume'):
         if volume.name == volume_name:
             return True
     return False
@@ -2544,17 +3249,11 @@ def delete_and_wait_pvc(api, pvc_name):
 
 
 def wait_delete_pvc(api, pvc_name):
-    for i in range(RETRY_COUNTS):
-        found = False
-        ret = api.list_namespaced_persistent_volume_claim(namespace='default')
-        for item in ret.items:
-            if item.metadata.name == pvc_name:
-                found = True
-                break
-        if not found:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert not found
+    wait_for_k8s_object(api.list_namespaced_persistent_volume_claim,
+                        pvc_name, lambda pvc: pvc is None,
+                        name='wait_delete_pvc',
+                        what='PVC %s to be deleted' % pvc_name,
+                        namespace='default')
 
 
 def delete_and_wait_pv(api, pv_name):
@@ -2568,47 +3267,43 @@ def delete_and_wait_pv(api, pv_name):
 
 
 def wait_delete_pv(api, pv_name):
-    for i in range(RETRY_COUNTS):
-        found = False
-        pvs = api.list_persistent_volume()
-        for item in pvs.items:
-            if item.metadata.name == pv_name:
-                if item.status.phase == 'Failed':
-                    try:
-                        api.delete_persistent_volume(
-                            name=pv_name, body=k8sclient.V1DeleteOptions())
-                    except ApiException as e:
-                        assert e.status == 404
-                else:
-                    found = True
-                    break
-        if not found:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert not found
+    def deleted(pv):
+        if pv is None:
+            return True
+        if pv.status.phase != 'Failed':
+            return False
+        try:
+            api.delete_persistent_volume(
+                name=pv_name, body=k8sclient.V1DeleteOptions())
+        except ApiException as e:
+            assert e.status == 404
+        return True
+
+    wait_for_k8s_object(api.list_persistent_volume, pv_name, deleted,
+                        name='wait_delete_pv',
+                        what='PV %s to be deleted' % pv_name)
 
 
 def wait_volume_kubernetes_status(client, volume_name, expect_ks):
-    for i in range(RETRY_COUNTS):
-        expected = True
-        volume = client.by_id_volume(volume_name)
-        ks = volume.kubernetesStatus
-        ks = json.loads(json.dumps(ks, default=lambda o: o.__dict__))
+    def kubernetes_status():
+        ks = client.by_id_volume(volume_name).kubernetesStatus
+        return json.loads(json.dumps(ks, default=lambda o: o.__dict__))
 
+    def expected(ks):
         for k, v in expect_ks.items():
             if k in ('lastPVCRefAt', 'lastPodRefAt'):
                 if (v != '' and ks[k] == '') or \
                    (v == '' and ks[k] != ''):
-                    expected = False
-                    break
+                    return False
             else:
                 if ks[k] != v:
-                    expected = False
-                    break
-        if expected:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert expected
+                    return False
+        return True
+
+    wait_until(kubernetes_status, expected,
+               name='wait_volume_kubernetes_status',
+               what='volume %s kubernetesStatus %s' % (volume_name,
+                                                       expect_ks))
 
 
 def create_pv_for_volume(client, core_api, volume, pv_name, fs_type="ext4"):
@@ -2680,13 +3375,11 @@ def activate_standby_volume(client, volume_name,
 
 
 def check_volume_last_backup(client, volume_name, last_backup):
-    for i in range(RETRY_COUNTS):
-        volume = client.by_id_volume(volume_name)
-        if volume.lastBackup == last_backup:
-            break
-        time.sleep(RETRY_INTERVAL)
-    volume = client.by_id_volume(volume_name)
-    assert volume.lastBackup == last_backup
+    wait_until(lambda: client.by_id_volume(volume_name),
+               lambda v: v.lastBackup == last_backup,
+               name='check_volume_last_backup',
+               what='volume %s lastBackup == %s' % (volume_name, last_backup),
+               observe=lambda v: v.lastBackup)
 
 
 def set_random_backupstore(client):
@@ -2765,64 +3458,43 @@ def delete_and_wait_volume_attachment(storage_api, volume_attachment_name):
 
 
 def wait_delete_volume_attachment(storage_api, volume_attachment_name):
-    for i in range(RETRY_COUNTS):
-        found = False
-        ret = storage_api.list_volume_attachment()
-        for item in ret.items:
-            if item.metadata.name == volume_attachment_name:
-                found = True
-                break
-        if not found:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert not found
+    wait_for_k8s_object(storage_api.list_volume_attachment,
+                        volume_attachment_name, lambda va: va is None,
+                        name='wait_delete_volume_attachment',
+                        what='volume attachment %s to be deleted' %
+                        volume_attachment_name)
 
 
 def wait_for_engine_image_deletion(client, core_api, engine_image_name):
-    deleted = False
-
-    for i in range(RETRY_COUNTS):
-        time.sleep(RETRY_INTERVAL)
-        deleted = True
-
-        ei_list = client.list_engine_image().data
-        for ei in ei_list:
+    def remaining():
+        for ei in client.list_engine_image().data:
             if ei.name == engine_image_name:
-                deleted = False
-                break
-        if not deleted:
-            continue
+                return ei
 
         labels = "longhorn.io/component=engine-image," \
                  "longhorn.io/engine-image="+engine_image_name
         ei_pod_list = core_api.list_namespaced_pod(
             LONGHORN_NAMESPACE, label_selector=labels).items
-        if len(ei_pod_list) != 0:
-            deleted = False
-            continue
+        return [pod.metadata.name for pod in ei_pod_list]
 
-    assert deleted
+    wait_until(remaining, lambda left: left == [],
+               name='wait_for_engine_image_deletion',
+               what='engine image %s and its pods to be deleted' %
+               engine_image_name)
 
 
 def create_snapshot(longhorn_api_client, volume_name):
     volume = longhorn_api_client.by_id_volume(volume_name)
-    snapshots = volume.snapshotList(volume=volume_name)
     snap = volume.snapshotCreate()
     snap_name = snap.name
 
-    snapshot_created = False
-    for i in range(RETRY_COUNTS):
+    def find_snapshot():
         snapshots = volume.snapshotList(volume=volume_name)
+        return _find_by_name(snapshots.data, snap_name)
 
-        for vs in snapshots.data:
-            if vs.name == snap_name:
-                snapshot_created = True
-                break
-        if snapshot_created is True:
-            break
-        time.sleep(RETRY_INTERVAL)
-
-    assert snapshot_created
+    wait_until(find_snapshot, lambda vs: vs is not None,
+               name='create_snapshot',
+               what='snapshot %s of volume %s' % (snap_name, volume_name))
     return snap
 
 
@@ -2844,15 +3516,13 @@ def wait_and_get_pv_for_pvc(api, pvc_name):
 
 
 def wait_for_volume_expansion(longhorn_api_client, volume_name):
-    complete = False
-    for i in range(RETRY_COUNTS):
-        volume = longhorn_api_client.by_id_volume(volume_name)
-        engine = get_volume_engine(volume)
-        if engine.size == volume.size and volume.state == "detached":
-            complete = True
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert complete
+    wait_until(lambda: longhorn_api_client.by_id_volume(volume_name),
+               lambda v: get_volume_engine(v).size == v.size and
+               v.state == "detached",
+               name='wait_for_volume_expansion',
+               what='volume %s expansion' % volume_name,
+               observe=lambda v: (v.size, get_volume_engine(v).size,
+                                  v.state))
 
 
 def check_block_device_size(volume, size):
@@ -2867,16 +3537,12 @@ def check_block_device_size(volume, size):
 
 
 def wait_for_dr_volume_expansion(longhorn_api_client, volume_name, size_str):
-    complete = False
-    for i in range(RETRY_COUNTS):
-        volume = longhorn_api_client.by_id_volume(volume_name)
-        if volume.size == size_str:
-            engine = get_volume_engine(volume)
-            if engine.size == volume.size:
-                complete = True
-                break
-        time.sleep(RETRY_INTERVAL)
-    assert complete
+    wait_until(lambda: longhorn_api_client.by_id_volume(volume_name),
+               lambda v: v.size == size_str and
+               get_volume_engine(v).size == v.size,
+               name='wait_for_dr_volume_expansion',
+               what='DR volume %s expansion to %s' % (volume_name, size_str),
+               observe=lambda v: (v.size, get_volume_engine(v).size))
 
 
 def expand_and_wait_for_pvc(api, pvc):
@@ -2922,23 +3588,17 @@ def fail_replica_expansion(client, api, volname, size, replicas=None):
 
 
 def wait_for_expansion_failure(client, volume_name, last_failed_at=""):
-    failed = False
-    for i in range(30):
-        volume = client.by_id_volume(volume_name)
-        engine = get_volume_engine(volume)
-        if engine.lastExpansionFailedAt != last_failed_at:
-            failed = True
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert failed
+    wait_until(lambda: get_volume_engine(client.by_id_volume(volume_name)),
+               lambda e: e.lastExpansionFailedAt != last_failed_at,
+               timeout=30 * RETRY_INTERVAL,
+               name='wait_for_expansion_failure',
+               what='volume %s expansion failure' % volume_name,
+               observe=lambda e: e.lastExpansionFailedAt)
 
 
 def wait_for_rebuild_complete(client, volume_name):
-    completed = 0
-    rebuild_statuses = {}
-    for i in range(RETRY_COUNTS):
+    def completed(v):
         completed = 0
-        v = client.by_id_volume(volume_name)
         rebuild_statuses = v.rebuildStatus
         for status in rebuild_statuses:
             if status.state == "complete":
@@ -2956,25 +3616,25 @@ def wait_for_rebuild_complete(client, volume_name):
                 assert status.state == "error"
                 assert status.error != ""
                 assert not status.isRebuilding
-        if completed == len(rebuild_statuses):
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert completed == len(rebuild_statuses)
+        return completed == len(rebuild_statuses)
+
+    wait_until(lambda: client.by_id_volume(volume_name), completed,
+               name='wait_for_rebuild_complete',
+               what='volume %s rebuild to complete' % volume_name,
+               observe=lambda v: v.rebuildStatus)
 
 
 def wait_for_rebuild_start(client, volume_name):
-    started = False
-    for i in range(RETRY_COUNTS):
-        v = client.by_id_volume(volume_name)
-        rebuild_statuses = v.rebuildStatus
-        for status in rebuild_statuses:
+    def in_progress(v):
+        for status in v.rebuildStatus:
             if status.state == "in_progress":
-                started = True
-                break
-        if started:
-            break
-        time.sleep(RETRY_INTERVAL)
-    assert started
+                return status
+        return None
+
+    status = wait_until(lambda: in_progress(client.by_id_volume(volume_name)),
+                        lambda status: status is not None,
+                        name='wait_for_rebuild_start',
+                        what='volume %s rebuild to start' % volume_name)
     return status.fromReplica, status.replica
 
 
@@ -3046,19 +3706,16 @@ def make_deployment_with_pvc(request):
 
 
 def wait_deployment_replica_ready(apps_api, deployment_name, desired_replica_count): # NOQA
-    replicas_ready = False
-    for i in range(DEFAULT_DEPLOYMENT_TIMEOUT):
-        deployment = apps_api.read_namespaced_deployment(
-            name=deployment_name,
-            namespace="default")
-
-        if deployment.status.ready_replicas == desired_replica_count:
-            replicas_ready = True
-            break
-
-        time.sleep(DEFAULT_DEPLOYMENT_INTERVAL)
-
-    assert replicas_ready
+    wait_for_k8s_object(
+        apps_api.list_namespaced_deployment, deployment_name,
+        lambda deployment: deployment is not None and
+        deployment.status.ready_replicas == desired_replica_count,
+        timeout=DEFAULT_DEPLOYMENT_TIMEOUT * DEFAULT_DEPLOYMENT_INTERVAL,
+        poll_interval=DEFAULT_DEPLOYMENT_INTERVAL,
+        name='wait_deployment_replica_ready',
+        what='deployment %s to have %d ready replicas' % (
+            deployment_name, desired_replica_count),
+        namespace="default")
 
 
 def create_and_wait_deployment(apps_api, deployment_manifest):
@@ -3077,17 +3734,14 @@ def create_and_wait_deployment(apps_api, deployment_manifest):
 
 
 def wait_delete_deployment(apps_api, deployment_name):
-    for i in range(DEFAULT_DEPLOYMENT_TIMEOUT):
-        ret = apps_api.list_namespaced_deployment(namespace='default')
-        found = False
-        for item in ret.items:
-            if item.metadata.name == deployment_name:
-                found = True
-                break
-        if not found:
-            break
-        time.sleep(DEFAULT_DEPLOYMENT_INTERVAL)
-    assert not found
+    wait_for_k8s_object(
+        apps_api.list_namespaced_deployment, deployment_name,
+        lambda deployment: deployment is None,
+        timeout=DEFAULT_DEPLOYMENT_TIMEOUT * DEFAULT_DEPLOYMENT_INTERVAL,
+        poll_interval=DEFAULT_DEPLOYMENT_INTERVAL,
+        name='wait_delete_deployment',
+        what='deployment %s to be deleted' % deployment_name,
+        namespace='default')
 
 
 def delete_and_wait_deployment(apps_api, deployment_name):
@@ -1,12 +1,13 @@
 import pytest
 
-from kubernetes import client as k8sclient, config as k8sconfig
-from kubernetes.client import Configuration
+import common
+import longhorn
+import wait_profiler
 
-from common import get_longhorn_api_client, \
+from common import get_core_api_client, get_longhorn_api_client, \
     NODE_CONDITION_MOUNTPROPAGATION, CONDITION_STATUS_TRUE
-from common import wait_for_node_mountpropagation_condition
 from common import check_longhorn, check_csi_expansion
+from common import RESET_STATS, WAIT_STATS
 
 
 INCLUDE_BASE_IMAGE_OPT = "--include-base-image-test"
@@ -15,6 +16,12 @@ INCLUDE_INFRA_OPT = "--include-infra-test"
 INCLUDE_STRESS_OPT = "--include-stress-test"
 INCLUDE_UPGRADE_OPT = "--include-upgrade-test"
 UPGRADE_IMAGE_TAG = "--upgrade-image-tag"
+API_METRICS_JSON_OPT = "--api-metrics-json"
+API_METRICS_PROM_OPT = "--api-metrics-prom"
+API_RECORD_OPT = "--api-record"
+WAIT_PROFILE_OPT = "--wait-profile"
+WAIT_PROFILE_BASELINE_OPT = "--wait-profile-baseline"
+BALANCED_CLIENT_OPT = "--balanced-client"
 
 
 def pytest_addoption(parser):
@@ -41,13 +48,57 @@ def pytest_addoption(parser):
                      default=False,
                      help="include upgrade tests (default: False)")
 
+    parser.addoption(API_METRICS_JSON_OPT, action="store", default=None,
+                     help="write Longhorn API latency metrics as JSON to \
+                           this file at the end of the session")
+
+    parser.addoption(API_METRICS_PROM_OPT, action="store", default=None,
+                     help="write Longhorn API latency metrics in Prometheus \
+                           text format to this file at the end of the \
+                           session")
+
+    parser.addoption(API_RECORD_OPT, action="store", default=None,
+                     help="record all Longhorn API traffic to this file \
+                           (gzip compressed if it ends in .gz) for \
+                           offline replay")
+
+    parser.addoption(WAIT_PROFILE_OPT, action="store", default=None,
+                     help="profile the time each test spends waiting and \
+                           write it as JSON to this file at the end of the \
+                           session")
+
+    parser.addoption(WAIT_PROFILE_BASELINE_OPT, action="store", default=None,
+                     help="report tests waiting longer than in this \
+                           earlier " + WAIT_PROFILE_OPT + " file")
+
+    parser.addoption(BALANCED_CLIENT_OPT, action="store_true", default=False,
+                     help="spread Longhorn API requests over all managers \
+                           instead of using one (default: False)")
+
+
+def pytest_configure(config):
+    common.BALANCED_CLIENT = config.getoption(BALANCED_CLIENT_OPT)
+
+    record_path = config.getoption(API_RECORD_OPT)
+    if record_path:
+        longhorn.RECORDING = longhorn.TrafficRecording(path=record_path)
+
+    profile_path = config.getoption(WAIT_PROFILE_OPT)
+    baseline_path = config.getoption(WAIT_PROFILE_BASELINE_OPT)
+    if profile_path or baseline_path:
+        profiler = wait_profiler.WaitProfiler(profile_path, baseline_path)
+        profiler.install()
+        config.pluginmanager.register(profiler, "wait_profiler")
+
+
+def pytest_unconfigure(config):
+    profiler = config.pluginmanager.get_plugin("wait_profiler")
+    if profiler is not None:
+        profiler.uninstall()
+
 
 def pytest_collection_modifyitems(config, items):
-    c = Configuration()
-    c.assert_hostname = False
-    Configuration.set_default(c)
-    k8sconfig.load_incluster_config()
-    core_api = k8sclient.CoreV1Api()
+    core_api = get_core_api_client()
 
     check_longhorn(core_api)
 
@@ -77,9 +128,11 @@ def pytest_collection_modifyitems(config, items):
                 item.add_marker(skip_csi_expansion)
 
     all_nodes_support_mount_propagation = True
-    for node in get_longhorn_api_client().list_node():
-        node = wait_for_node_mountpropagation_condition(
-            get_longhorn_api_client(), node.name)
+    client = get_longhorn_api_client()
+    for node in client.list_node():
+        # Looked up on common so the wait profiler's wrapper is used.
+        node = common.wait_for_node_mountpropagation_condition(client,
+                                                               node.name)
         if "conditions" not in node.keys():
             all_nodes_support_mount_propagation = False
         else:
@@ -131,3 +184,37 @@ def pytest_collection_modifyitems(config, items):
         for item in items:
             if "upgrade" in item.keywords:
                 item.add_marker(skip_upgrade)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    json_path = session.config.getoption(API_METRICS_JSON_OPT)
+    if json_path:
+        with open(json_path, 'w') as f:
+            f.write(longhorn.METRICS.to_json())
+
+    prom_path = session.config.getoption(API_METRICS_PROM_OPT)
+    if prom_path:
+        with open(prom_path, 'w') as f:
+            f.write(longhorn.METRICS.to_prometheus())
+
+    if longhorn.RECORDING is not None:
+        longhorn.RECORDING.close()
+
+
+def pytest_terminal_summary(terminalreporter):
+    if RESET_STATS:
+        terminalreporter.write_sep("-", "fixture resets")
+        for step in sorted(RESET_STATS):
+            stats = RESET_STATS[step]
+            terminalreporter.write_line("%s: %d skipped, %d run" % (
+                step, stats['skipped'], stats['run']))
+
+    if WAIT_STATS:
+        terminalreporter.write_sep("-", "waits")
+        for name in sorted(WAIT_STATS,
+                           key=lambda n: -WAIT_STATS[n]['seconds']):
+            stats = WAIT_STATS[name]
+            terminalreporter.write_line(
+                "%s: %d waits, %d polls, %.1fs, %d timed out" % (
+                    name, stats['calls'], stats['polls'], stats['seconds'],
+                    stats['timeouts']))
@@ -1,16 +1,27 @@
 #!/usr/bin/env python
 
 from __future__ import print_function
+import asyncio
+import codecs
+import concurrent.futures
+import functools
+import gzip
 import six
+from six.moves.urllib.parse import urlparse, parse_qs
 import re
 import requests
 import collections
+import csv
+import copy
 import hashlib
 import os
 import json
+import random
 import time
+import threading
 import operator
 from functools import reduce
+from six.moves import zip_longest
 
 try:
     import argcomplete
@@ -41,6 +52,9 @@ DELETE = 'delete-'
 ACTION = 'action-'
 TRIM = True
 JSON = False
+FORMAT = 'table'
+FIELDS = None
+ROW_FORMATS = ('jsonl', 'csv')
 
 GET_METHOD = 'GET'
 POST_METHOD = 'POST'
@@ -53,6 +67,23 @@ LIST_METHODS = {'__iter__': True, '__len__': True, '__getitem__': True}
 
 DEFAULT_TIMEOUT = 45
 
+SCHEMA_CACHE_VERSION = 5
+
+DEFAULT_POOL_SIZE = 10
+# (connect, read) seconds for a single API request
+DEFAULT_REQUEST_TIMEOUT = (5, 60)
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Methods resent after a failure that may have reached the server. DELETE
+# is left out: Longhorn answers a repeated one with 404, so it is only
+# resent when it never got to the server, like POST.
+RESEND_METHODS = frozenset([GET_METHOD, PUT_METHOD])
+
+# Upper bounds (seconds) of the API latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60)
+
 
 def echo(fn):
     def wrapped(*args, **kw):
@@ -62,22 +93,29 @@ def echo(fn):
     return wrapped
 
 
-def timed_url(fn):
-    def wrapped(*args, **kw):
-        if TIME:
-            start = time.time()
-            ret = fn(*args, **kw)
-            delta = time.time() - start
-            print(delta, args[1], fn.__name__)
-            return ret
-        else:
-            return fn(*args, **kw)
-    return wrapped
+class RestObject(object):
+    # Links, actions and pagination callbacks are not stored in __dict__.
+    # They are resolved from the raw 'links'/'actions' maps on first
+    # attribute access and kept in _bound, so decoding a large collection
+    # doesn't build closures that are never used.
+    __slots__ = ('_client', '_bound', '__dict__')
 
+    def __init__(self, client=None):
+        self._client = client
+        self._bound = None
 
-class RestObject:
-    def __init__(self):
-        pass
+    def __copy__(self):
+        result = RestObject.__new__(type(self))
+        RestObject.__init__(result, self._client)
+        result.__dict__.update(self.__dict__)
+        return result
+
+    def __deepcopy__(self, memo):
+        result = RestObject.__new__(type(self))
+        RestObject.__init__(result, self._client)
+        memo[id(self)] = result
+        result.__dict__.update(copy.deepcopy(self.__dict__, memo))
+        return result
 
     @staticmethod
     def _is_public(k, v):
@@ -129,16 +167,229 @@ class RestObject:
         return self.__dict__[key]
 
     def __getattr__(self, k):
+        if k.startswith('__') or k in RestObject.__slots__:
+            raise AttributeError(k)
+        bound = self._bound
+        if bound is not None and k in bound:
+            return bound[k]
+        cb = self._resolve(k)
+        if cb is not None:
+            if bound is None:
+                bound = self._bound = {}
+            bound[k] = cb
+            return cb
         if self._is_list() and k in LIST_METHODS:
             return getattr(self.data, k)
         return getattr(self.__dict__, k)
 
+    def _resolve(self, k):
+        client = self._client
+        if client is None:
+            return None
+        d = self.__dict__
+
+        if k in ('next', 'prev') and k not in d:
+            url = _fields(d.get('pagination')).get(k)
+            if url is not None:
+                return lambda url=url: client._get(url)
+
+        if not isinstance(d.get('type'), six.string_types):
+            return None
+
+        # Generated resource classes keep links and actions undecoded.
+        links = _fields(d.get('links'))
+        actions = _fields(d.get('actions'))
+
+        # Same naming rules as eager binding: a link or action that clashes
+        # with a field gets a '_link'/'_action' suffix, and an action that
+        # clashes with a link gets the '_action' suffix.
+        name = k
+        if k.endswith('_link') and k[:-5] in d:
+            name = k[:-5]
+        if name in links and (name != k or name not in d):
+            def link_cb(_link=links[name], **kw):
+                return client._get(_link, data=kw)
+            return link_cb
+
+        name = k
+        if k.endswith('_action') and (k[:-7] in d or k[:-7] in links):
+            name = k[:-7]
+        if name in actions and \
+                (name != k or (name not in d and name not in links)):
+            def action_cb(*args, **kw):
+                return client.action(self, name, *args, **kw)
+            return action_cb
+
+        return None
+
     def __iter__(self):
         if self._is_list():
             return iter(self.data)
         return iter(self.__dict__)
 
 
+def _fields(value):
+    if isinstance(value, RestObject):
+        return value.__dict__
+    if isinstance(value, dict):
+        return value
+    return {}
+
+
+class LazyField(object):
+    """
+    Field of a TypedResource holding nested objects, decoded with
+    decode(client, value) on first access and stored back decoded.
+    """
+    __slots__ = ('name', 'decode')
+
+    def __init__(self, name, decode):
+        self.name = name
+        self.decode = decode
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        d = obj.__dict__
+        try:
+            value = d[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+        t = type(value)
+        if t is dict or (t is list and value and
+                         type(value[0]) in (dict, list)):
+            value = d[self.name] = self.decode(obj._client, value)
+        return value
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+
+    def __delete__(self, obj):
+        try:
+            del obj.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+
+
+def decode_any(client, value):
+    # Untyped values: every dict becomes a RestObject, as with
+    # GdapiClient.object_hook.
+    t = type(value)
+    if t is dict:
+        result = RestObject(client)
+        d = result.__dict__
+        for k, v in six.iteritems(value):
+            d[k] = decode_any(client, v)
+        return result
+    if t is list:
+        return [decode_any(client, v) for v in value]
+    return value
+
+
+def decode_array(decode):
+    def decode_array(client, value):
+        if type(value) is not list:
+            return decode_any(client, value)
+        return [decode(client, v) for v in value]
+    return decode_array
+
+
+def decode_map(decode):
+    def decode_map(client, value):
+        if type(value) is not dict:
+            return decode_any(client, value)
+        result = RestObject(client)
+        d = result.__dict__
+        for k, v in six.iteritems(value):
+            d[k] = decode(client, v)
+        return result
+    return decode_map
+
+
+class TypedResource(RestObject):
+    """
+    Base class of the resource classes generated from a schema by
+    scripts/generate_resources.py.
+
+    A typed resource wraps the dict json.loads() returned for it, without
+    copying it or visiting its keys. Nested objects are left as dicts and
+    turned into resources by the LazyField for their field when it is
+    first read.
+    """
+    __slots__ = ()
+
+    links = LazyField('links', decode_any)
+    actions = LazyField('actions', decode_any)
+
+    @classmethod
+    def decode(cls, client, value):
+        if type(value) is not dict:
+            return value
+        obj = cls.__new__(cls)
+        obj._client = client
+        obj._bound = None
+        obj.__dict__ = value
+        return obj
+
+    def __getitem__(self, key):
+        field = getattr(type(self), key, None)
+        if isinstance(field, LazyField):
+            return field.__get__(self, type(self))
+        return RestObject.__getitem__(self, key)
+
+
+def decode_typed(client, value, classes):
+    """
+    Decode a json.loads() result with generated resource classes, keyed by
+    type name. Resources of other types are decoded like object_hook
+    would.
+    """
+    if type(value) is list:
+        return [decode_typed(client, v, classes) for v in value]
+    if type(value) is not dict:
+        return value
+
+    cls = classes.get(value.get('type'))
+    if cls is not None:
+        return cls.decode(client, value)
+    if value.get('type') != 'collection' or \
+            type(value.get('data')) is not list:
+        return decode_any(client, value)
+
+    result = RestObject(client)
+    d = result.__dict__
+    for k, v in six.iteritems(value):
+        if k == 'data':
+            d[k] = [decode_typed(client, i, classes) for i in v]
+        else:
+            d[k] = decode_any(client, v)
+    return result
+
+
+def _public_fields(obj):
+    # The fields of a RestObject that are sent to the server. Its own
+    # __dict__ is returned, without copying, unless something needs to be
+    # left out.
+    d = obj.__dict__
+    for k, v in six.iteritems(d):
+        if k.startswith('_') or callable(v):
+            break
+    else:
+        return d
+    return dict((k, v) for k, v in six.iteritems(d)
+                if not k.startswith('_') and not callable(v))
+
+
+def _json_default(obj):
+    # json.dumps() hook: RestObjects are encoded in place, collections as
+    # their list of items.
+    if isinstance(obj, RestObject):
+        if obj.__dict__.get('type') == 'collection' and obj._is_list():
+            return obj.data
+        return _public_fields(obj)
+    raise TypeError('{!r} is not JSON serializable'.format(obj))
+
+
 class Schema(object):
     def __init__(self, text, obj):
         self.text = text
@@ -179,6 +430,73 @@ class Schema(object):
             if not hasattr(t, 'collectionFilters'):
                 t.collectionFilters = {}
 
+        self.bindings = self._binding_table()
+        self.commands = self._command_table()
+
+    def _binding_table(self):
+        # (attribute, client method, type) for every list_*, by_id_*,
+        # by_ids_*, update_by_id_* and create_* method the client should
+        # expose.
+        bindings = [
+            ('list', 'collectionMethods', GET_METHOD),
+            ('by_id', 'collectionMethods', GET_METHOD),
+            ('by_ids', 'collectionMethods', GET_METHOD),
+            ('update_by_id', 'resourceMethods', PUT_METHOD),
+            ('create', 'collectionMethods', POST_METHOD)
+        ]
+
+        table = []
+        for type_name, typ in six.iteritems(self.types):
+            for name_variant in GdapiClient._type_name_variants(type_name):
+                for method_name, type_collection, test_method in bindings:
+                    if test_method in getattr(typ, type_collection, []):
+                        table.append(('_'.join([method_name, name_variant]),
+                                      method_name, type_name))
+        return table
+
+    def fingerprint(self):
+        # Digest of the types, their field types and actions, leaving out
+        # links and anything else that differs between managers.
+        types = {}
+        for type_name, typ in six.iteritems(self.types):
+            fields = _fields(typ.__dict__.get('resourceFields'))
+            actions = _fields(typ.__dict__.get('resourceActions'))
+            types[type_name] = {
+                'fields': dict((k, _fields(v).get('type'))
+                               for k, v in six.iteritems(fields)),
+                'actions': sorted(actions),
+            }
+        text = json.dumps(types, sort_keys=True)
+        return 'sha1:' + hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _command_table(self):
+        # (command, action, type, help) for every CLI sub-command, so the
+        # CLI can find the one invoked without building all of them.
+        table = []
+        for type_name in sorted(self.types):
+            typ = self.types[type_name]
+            for operation, allowed in [(LIST, typ.listable),
+                                       (CREATE, typ.creatable),
+                                       (UPDATE, typ.updatable),
+                                       (DELETE, typ.deletable)]:
+                if not allowed:
+                    continue
+                if operation == LIST:
+                    help_msg = 'List ' + type_name
+                else:
+                    help_msg = operation[0:len(operation)-1].capitalize() + \
+                        ' ' + type_name + ' resource'
+                table.append((operation + type_name, operation, type_name,
+                              help_msg))
+
+            actions = typ.__dict__.get('resourceActions')
+            if isinstance(actions, RestObject):
+                for name in sorted(actions.__dict__):
+                    table.append((type_name + '-' + name, ACTION + name,
+                                  type_name,
+                                  'Action ' + name + ' on ' + type_name))
+        return table
+
     def __str__(self):
         return str(self.text)
 
@@ -186,6 +504,971 @@ class Schema(object):
         return repr(self.text)
 
 
+class LatencyHistogram(object):
+    """
+    Fixed-bucket latency histogram. Percentiles are interpolated within
+    the bucket they fall in, so memory stays constant per endpoint.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) \
+                    else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n,
+                           self.max)
+            seen += n
+        return self.max
+
+
+class EndpointMetrics(object):
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.conflicts = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+class ClientMetrics(object):
+    """
+    Request metrics for API clients, per (HTTP method, resource type,
+    action): a latency histogram, error and 409 conflict counts, retries
+    made by the client's RetryPolicy and bytes transferred.
+
+    All clients record into METRICS unless they are given their own
+    instance. Thread-safe.
+    """
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def endpoint(method, url):
+        u = urlparse(url)
+        path = [p for p in u.path.split('/') if p]
+        resource = path[1] if len(path) > 1 else 'root'
+        action = parse_qs(u.query).get('action', [''])[0]
+        return method, resource, action
+
+    def _get(self, key):
+        m = self._endpoints.get(key)
+        if m is None:
+            m = self._endpoints.setdefault(key, EndpointMetrics())
+        return m
+
+    def record(self, method, url, seconds, status_code,
+               bytes_sent=0, bytes_received=0):
+        key = self.endpoint(method, url)
+        with self._lock:
+            m = self._get(key)
+            m.latency.observe(seconds)
+            if status_code < 200 or status_code >= 300:
+                m.errors += 1
+            if status_code == 409:
+                m.conflicts += 1
+            m.bytes_sent += bytes_sent
+            m.bytes_received += bytes_received
+
+    def record_retry(self, method, url):
+        key = self.endpoint(method, url)
+        with self._lock:
+            self._get(key).retries += 1
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def summary(self):
+        result = []
+        with self._lock:
+            for (method, resource, action), m in \
+                    sorted(self._endpoints.items()):
+                h = m.latency
+                result.append({
+                    'method': method,
+                    'resource': resource,
+                    'action': action,
+                    'count': h.count,
+                    'errors': m.errors,
+                    'conflicts': m.conflicts,
+                    'conflict_rate': float(m.conflicts) / h.count
+                    if h.count else 0.0,
+                    'retries': m.retries,
+                    'bytes_sent': m.bytes_sent,
+                    'bytes_received': m.bytes_received,
+                    'latency': {
+                        'sum': h.sum,
+                        'max': h.max,
+                        'p50': h.percentile(0.5),
+                        'p90': h.percentile(0.9),
+                        'p99': h.percentile(0.99),
+                        'buckets': list(zip(h.buckets + ('+Inf',),
+                                            h.counts)),
+                    },
+                })
+        return result
+
+    def to_json(self):
+        return json.dumps({'endpoints': self.summary()}, indent=2)
+
+    def to_prometheus(self, prefix='longhorn_api'):
+        lines = []
+        counters = [
+            ('requests_total', 'count', 'API requests'),
+            ('errors_total', 'errors', 'API requests with a non-2xx status'),
+            ('conflicts_total', 'conflicts', 'API requests answered 409'),
+            ('retries_total', 'retries', 'API requests retried'),
+            ('request_bytes_total', 'bytes_sent', 'API request body bytes'),
+            ('response_bytes_total', 'bytes_received',
+             'API response body bytes'),
+        ]
+        summary = self.summary()
+        for name, field, help in counters:
+            lines.append('# HELP {}_{} {}'.format(prefix, name, help))
+            lines.append('# TYPE {}_{} counter'.format(prefix, name))
+            for e in summary:
+                lines.append('{}_{}{{{}}} {}'.format(
+                    prefix, name, _prometheus_labels(e), e[field]))
+
+        name = prefix + '_request_duration_seconds'
+        lines.append('# HELP {} API request latency'.format(name))
+        lines.append('# TYPE {} histogram'.format(name))
+        for e in summary:
+            labels = _prometheus_labels(e)
+            cumulative = 0
+            for le, n in e['latency']['buckets']:
+                cumulative += n
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(
+                    name, labels, le, cumulative))
+            lines.append('{}_sum{{{}}} {}'.format(
+                name, labels, e['latency']['sum']))
+            lines.append('{}_count{{{}}} {}'.format(
+                name, labels, e['count']))
+        return '\n'.join(lines) + '\n'
+
+
+def _prometheus_labels(endpoint):
+    return ','.join('{}="{}"'.format(k, endpoint[k])
+                    for k in ('method', 'resource', 'action'))
+
+
+METRICS = ClientMetrics()
+
+
+class HttpTransport(object):
+    """
+    Pooled HTTP transport for the API client.
+
+    A transport owns one requests.Session whose adapters keep up to
+    pool_size keep-alive connections per host. It is safe to share one
+    transport between threads and between clients talking to the same
+    manager: the session is configured once here and never mutated per
+    request, and urllib3 gives each concurrent request its own connection
+    from the pool. With pool_block=True, threads beyond pool_size wait for
+    a free connection instead of opening throwaway ones.
+
+    Every request gets a timeout (DEFAULT_REQUEST_TIMEOUT unless one is
+    passed), so a hung manager raises instead of blocking forever.
+
+    scripts/check_transport.py checks pooling, sharing between threads and
+    timeouts against a local HTTP server.
+    """
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, pool_block=False,
+                 keep_alive=True, timeout=DEFAULT_REQUEST_TIMEOUT):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                                pool_maxsize=pool_size,
+                                                pool_block=pool_block)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+
+    def request(self, method, url, timeout=None, **kw):
+        if timeout is None:
+            timeout = self.timeout
+        return self.session.request(method, url, timeout=timeout, **kw)
+
+    def close(self):
+        self.session.close()
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(address, **kw):
+    """
+    Return the shared transport for a manager address, creating it with
+    the given HttpTransport arguments on first use.
+    """
+    with _transports_lock:
+        transport = _transports.get(address)
+        if transport is None:
+            transport = HttpTransport(**kw)
+            _transports[address] = transport
+        return transport
+
+
+class BalancedTransport(HttpTransport):
+    """
+    HttpTransport spreading requests over several managers of the same
+    cluster. Any manager can serve any request, so the host of each URL is
+    replaced by one of addresses ("ip:port").
+
+    GETs go to the manager with the fewest requests in flight, ties taken
+    in turn; other requests go to the first manager that is up. For
+    pin_interval seconds after a write, GETs from the same thread go to
+    the manager that took the write while it is up, so a helper reading
+    back what it just changed doesn't see another manager's stale copy.
+
+    A manager that fails with a connection error or timeout is marked down
+    for down_interval seconds and the request is sent to the next one,
+    unless it is a POST or DELETE that may already have reached the
+    server. When every manager is down they are still tried, longest down
+    first.
+    """
+    def __init__(self, addresses, down_interval=10, pin_interval=5, **kw):
+        super(BalancedTransport, self).__init__(**kw)
+        self.addresses = list(addresses)
+        self.down_interval = down_interval
+        self.pin_interval = pin_interval
+        self._pinned = threading.local()
+        self._outstanding = dict.fromkeys(self.addresses, 0)
+        self._down_until = dict.fromkeys(self.addresses, 0)
+        self._turn = 0
+        self._lock = threading.Lock()
+
+    def _candidates(self, method):
+        now = time.time()
+        n = len(self.addresses)
+        with self._lock:
+            up = [a for a in self.addresses if self._down_until[a] <= now]
+            down = sorted((a for a in self.addresses if a not in up),
+                          key=lambda a: self._down_until[a])
+            if method == GET_METHOD:
+                turn = self._turn
+                self._turn += 1
+                order = dict((a, (i - turn) % n)
+                             for i, a in enumerate(self.addresses))
+                up.sort(key=lambda a: (self._outstanding[a], order[a]))
+                pinned, until = getattr(self._pinned, 'write', (None, 0))
+                if pinned in up and until > now:
+                    up.remove(pinned)
+                    up.insert(0, pinned)
+        return up + down
+
+    def mark_down(self, address):
+        with self._lock:
+            self._down_until[address] = time.time() + self.down_interval
+
+    def healthy(self):
+        now = time.time()
+        with self._lock:
+            return [a for a in self.addresses if self._down_until[a] <= now]
+
+    def request(self, method, url, **kw):
+        u = urlparse(url)
+        error = None
+        for address in self._candidates(method):
+            with self._lock:
+                self._outstanding[address] += 1
+            try:
+                r = super(BalancedTransport, self).request(
+                    method, u._replace(netloc=address).geturl(), **kw)
+                if method != GET_METHOD:
+                    self._pinned.write = (address,
+                                          time.time() + self.pin_interval)
+                return r
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as e:
+                self.mark_down(address)
+                if method not in RESEND_METHODS and \
+                        not _request_not_sent(e):
+                    raise
+                error = e
+            finally:
+                with self._lock:
+                    self._outstanding[address] -= 1
+        raise error
+
+
+def get_balanced_transport(addresses, **kw):
+    """
+    Return the shared BalancedTransport for a set of manager addresses,
+    creating it with the given arguments on first use.
+    """
+    key = tuple(sorted(addresses))
+    with _transports_lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport = BalancedTransport(addresses, **kw)
+            _transports[key] = transport
+        return transport
+
+
+# Response headers kept in recordings; the client reads no others.
+RECORDED_HEADERS = ('Content-Type', 'ETag', 'X-API-Schemas')
+
+
+def _request_key(method, url, params=None, data=None):
+    # Requests match regardless of the manager they were sent to.
+    u = urlparse(url)
+    path = u.path
+    if u.query:
+        path += '?' + u.query
+    params = ResponseCache.key(url, params)[1]
+    return method, path, params, data or None
+
+
+class TrafficRecording(object):
+    """
+    API requests and responses recorded by RecordingTransport, replayed by
+    ReplayTransport. Saved as JSON lines, gzip compressed when the file
+    name ends in .gz.
+
+    With path, every entry is written to that file as it is recorded
+    instead of being kept in entries, so a long session doesn't hold its
+    traffic in memory; close() the recording when done.
+    """
+    VERSION = 1
+
+    def __init__(self, entries=None, path=None):
+        self.entries = entries or []
+        self._file = None
+        self._lock = threading.Lock()
+        if path is not None:
+            self._file = self._open(path, 'w')
+            self._write_header(self._file)
+
+    def add(self, method, url, params, data, response, elapsed):
+        headers = dict((k, response.headers[k]) for k in RECORDED_HEADERS
+                       if k in response.headers)
+        entry = {
+            'method': method,
+            'url': url,
+            'params': dict((k, str(v)) for k, v in
+                           six.iteritems(params or {})),
+            'data': data,
+            'status': response.status_code,
+            'headers': headers,
+            'elapsed': round(elapsed, 6),
+            'content': response.content.decode('utf-8'),
+        }
+        with self._lock:
+            if self._file is not None:
+                self._write_entry(self._file, entry)
+            else:
+                self.entries.append(entry)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @staticmethod
+    def _open(path, mode):
+        if path.endswith('.gz'):
+            return gzip.open(path, mode + 't', encoding='utf-8')
+        return open(path, mode)
+
+    def _write_header(self, f):
+        f.write(json.dumps({'version': self.VERSION}) + '\n')
+
+    @staticmethod
+    def _write_entry(f, entry):
+        f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+    def save(self, path):
+        with self._lock:
+            entries = list(self.entries)
+        with self._open(path, 'w') as f:
+            self._write_header(f)
+            for entry in entries:
+                self._write_entry(f, entry)
+
+    @classmethod
+    def load(cls, path):
+        with cls._open(path, 'r') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != cls.VERSION:
+                raise ClientApiError('unsupported recording version in ' +
+                                     path)
+            return cls([json.loads(line) for line in f if line.strip()])
+
+
+class RecordingTransport(object):
+    """
+    Transport wrapper adding every request made through it, with its
+    response and latency, to a TrafficRecording.
+    """
+    def __init__(self, transport, recording):
+        self.transport = transport
+        self.recording = recording
+
+    def request(self, method, url, **kw):
+        start = time.time()
+        r = self.transport.request(method, url, **kw)
+        # Streamed responses are read here so they can be recorded; the
+        # caller still gets the whole body.
+        self.recording.add(method, url, kw.get('params'), kw.get('data'),
+                           r, time.time() - start)
+        return r
+
+    def close(self):
+        self.transport.close()
+
+
+class ReplayTransport(object):
+    """
+    Transport answering requests from a TrafficRecording, without a
+    manager. A request gets the responses recorded for the same method,
+    path, parameters and body, in recorded order; once they have all been
+    used the last one keeps being returned, so polling loops see the same
+    sequence of states every run. A request that was never recorded
+    raises ClientApiError.
+
+    latency adds a fixed delay to every response; with
+    recorded_latency=True each response also takes as long as it did
+    when it was recorded.
+    """
+    def __init__(self, recording, latency=0, recorded_latency=False):
+        if isinstance(recording, six.string_types):
+            recording = TrafficRecording.load(recording)
+        self.latency = latency
+        self.recorded_latency = recorded_latency
+        self._responses = collections.defaultdict(collections.deque)
+        for entry in recording.entries:
+            key = _request_key(entry['method'], entry['url'],
+                               entry['params'], entry['data'])
+            self._responses[key].append(entry)
+        self._lock = threading.Lock()
+
+    def request(self, method, url, params=None, data=None, **kw):
+        key = _request_key(method, url, params, data)
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                raise ClientApiError('no recorded response for {} {}'.format(
+                    method, key[1]))
+            entry = responses[0]
+            if len(responses) > 1:
+                responses.popleft()
+
+        delay = self.latency
+        if self.recorded_latency:
+            delay += entry['elapsed']
+        if delay:
+            time.sleep(delay)
+
+        r = requests.Response()
+        r.status_code = entry['status']
+        r.headers.update(entry['headers'])
+        r._content = entry['content'].encode('utf-8')
+        r._content_consumed = True
+        r.encoding = 'utf-8'
+        r.url = url
+        return r
+
+    def close(self):
+        pass
+
+
+# When set, every new client records its traffic here.
+RECORDING = None
+
+
+class RetryBudget(object):
+    """
+    Token bucket limiting retries to a fraction of the requests made.
+    Every request deposits ratio tokens, up to cap, and every retry takes
+    one, so a flapping manager can't multiply the load on it. The bucket
+    starts with initial tokens so the first failures can be retried.
+    """
+    def __init__(self, ratio=0.2, initial=10, cap=100):
+        self.ratio = ratio
+        self.cap = cap
+        self._tokens = float(initial)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.cap, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy(object):
+    """
+    Decides which failed requests are retried and how long to wait.
+
+    A request is retried when classify() gives a reason for it, the
+    attempt limit hasn't been reached and the budget has a token left.
+    Connection errors, timeouts and the statuses in retry_statuses are
+    only retried for GET and PUT; a POST or DELETE is retried only when
+    the connection could not be made, so an action is never sent twice
+    and a delete that went through doesn't come back as 404. 500 is not
+    retried: the manager answers invalid requests with it. 409 conflicts
+    are retried by _put_and_retry and _post_and_retry, as before, without
+    taking from the budget.
+
+    The wait before retry n is base_delay * multiplier ** n, capped at
+    max_delay, of which a random fraction up to jitter is taken off.
+
+    With circuit_breaker=True (off by default), requests go through the
+    CircuitBreaker of their manager address, or of their set of managers
+    for a BalancedTransport. Subclass and override classify() or delay()
+    to change the policy. Retry counts are available from stats().
+    """
+    def __init__(self, max_attempts=4, base_delay=0.1, max_delay=5.0,
+                 multiplier=2.0, jitter=0.5,
+                 retry_statuses=(502, 503, 504), budget=None,
+                 circuit_breaker=False):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        if budget is None:
+            budget = RetryBudget()
+        self.budget = budget
+        self.circuit_breaker = circuit_breaker
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def classify(self, method, response=None, error=None):
+        resend = method in RESEND_METHODS
+        if error is not None:
+            if _request_not_sent(error):
+                return 'connection'
+            if resend and isinstance(
+                    error, (requests.exceptions.ConnectionError,
+                            requests.exceptions.Timeout)):
+                return 'connection'
+            return None
+        if resend and response.status_code in self.retry_statuses:
+            return 'status'
+        return None
+
+    def delay(self, attempt):
+        delay = min(self.max_delay,
+                    self.base_delay * self.multiplier ** attempt)
+        return delay * (1 - self.jitter * random.random())
+
+    def started(self):
+        self.budget.deposit()
+
+    def should_retry(self, attempt, reason, max_attempts=None):
+        # attempt counts from 0 for the request that just failed.
+        if max_attempts is None:
+            max_attempts = self.max_attempts
+        if attempt + 1 >= max_attempts:
+            self._count('gave_up')
+            return False
+        if not self.budget.withdraw():
+            self._count('budget_exhausted')
+            return False
+        self._count('retries_' + reason)
+        return True
+
+    def count_retry(self, reason):
+        self._count('retries_' + reason)
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            'retries': dict((k[len('retries_'):], v)
+                            for k, v in counts.items()
+                            if k.startswith('retries_')),
+            'gave_up': counts.get('gave_up', 0),
+            'budget_exhausted': counts.get('budget_exhausted', 0),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+def _request_not_sent(error):
+    # True when the request never reached the server, so even a
+    # POST or DELETE can be sent again.
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError) or \
+            not error.args:
+        return False
+    reason = getattr(error.args[0], 'reason', None)
+    return isinstance(reason,
+                      requests.packages.urllib3.exceptions.NewConnectionError)
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+class CircuitBreaker(object):
+    """
+    Fails requests to a manager fast once failure_threshold consecutive
+    requests to it failed with a connection error, a timeout or a 502, 503
+    or 504 status; other errors come from a live manager. After
+    reset_timeout seconds one trial request is let through; the circuit
+    closes again if it succeeds, and stays open another reset_timeout if
+    it doesn't.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, address, failure_threshold=5, reset_timeout=10):
+        self.address = address
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.opened = 0
+        self.rejected = 0
+        self._failures = 0
+        self._opened_at = 0
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and \
+                    time.time() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return
+            self.rejected += 1
+        raise CircuitOpenError(self.address)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or \
+                    self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.time()
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(address, **kw):
+    """
+    Return the circuit breaker shared by all clients of a manager address,
+    creating it with the given CircuitBreaker arguments on first use.
+    """
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(address)
+        if breaker is None:
+            breaker = CircuitBreaker(address, **kw)
+            _circuit_breakers[address] = breaker
+        return breaker
+
+
+class ResponseCache(object):
+    """
+    LRU cache of GET responses for one client, keyed by URL and query
+    parameters.
+
+    Each entry keeps the raw body, its ETag (if the server sent one) and
+    the decoded object. Later GETs for the same key are sent with
+    If-None-Match, and when the server answers 304 or returns a byte
+    identical body, the previously decoded object is returned without
+    running json.loads again.
+
+    A hit returns the same object as the previous call, so callers must
+    treat results as read-only (copy.deepcopy() before mutating).
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url, params=None):
+        if not params:
+            return url, ()
+        return url, tuple(sorted((k, str(v))
+                                 for k, v in six.iteritems(params)))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag, body, obj):
+        with self._lock:
+            self._entries[key] = (etag, body, obj)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class _Flight(object):
+    __slots__ = ('done', 'finished', 'result', 'error', 'max_age')
+
+    def __init__(self, max_age):
+        self.done = threading.Event()
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.max_age = max_age
+
+
+class RequestCoalescer(object):
+    """
+    Single-flight GETs for one client: concurrent GETs of the same URL and
+    query parameters share one in-flight request and its decoded result.
+
+    By default a result is only shared with the calls that were waiting
+    for it. With max_age, a finished result keeps being returned for that
+    many seconds; max_ages overrides it per resource type, keyed by the
+    collection name in the URL (e.g. {'volumes': 0.5, 'nodes': 2}).
+    Errors are shared with waiting calls but never reused. Expired
+    results are dropped whenever a new request starts, and beyond
+    max_entries the oldest finished ones are too.
+
+    Shared results are the same object for every caller, so callers must
+    treat them as read-only (copy.deepcopy() before mutating).
+    """
+    def __init__(self, max_age=0, max_ages=None, max_entries=256):
+        self.max_age = max_age
+        self.max_ages = max_ages or {}
+        self.max_entries = max_entries
+        self.requests = 0
+        self.shared = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    key = staticmethod(ResponseCache.key)
+
+    def max_age_for(self, url):
+        path = [p for p in urlparse(url).path.split('/') if p]
+        if len(path) > 1:
+            return self.max_ages.get(path[1], self.max_age)
+        return self.max_age
+
+    def do(self, key, url, fn):
+        max_age = self.max_age_for(url)
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and flight.finished is not None and \
+                    time.time() - flight.finished > max_age:
+                flight = None
+            leader = flight is None
+            if leader:
+                self._prune()
+                flight = _Flight(max_age)
+                self._flights[key] = flight
+                self.requests += 1
+            else:
+                self.shared += 1
+
+        if leader:
+            try:
+                flight.result = fn()
+            except Exception as e:
+                flight.error = e
+            with self._lock:
+                flight.finished = time.time()
+                if (flight.error is not None or not max_age) and \
+                        self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _prune(self):
+        # Flights are kept in start order, so the oldest go first.
+        now = time.time()
+        excess = len(self._flights) + 1 - self.max_entries
+        for key, flight in list(self._flights.items()):
+            if flight.finished is None:
+                continue
+            if excess > 0 or now - flight.finished > flight.max_age:
+                del self._flights[key]
+                excess -= 1
+
+    def stats(self):
+        with self._lock:
+            return {'requests': self.requests, 'shared': self.shared,
+                    'entries': len(self._flights)}
+
+    def clear(self):
+        with self._lock:
+            self._flights.clear()
+
+
+class _JsonStream(object):
+    """
+    Incremental reader of JSON values from an iterator of text chunks.
+    Only as much of the input as the value being decoded is buffered.
+    """
+    _WHITESPACE = ' \t\n\r'
+    _DELIMITERS = _WHITESPACE + ',]}'
+
+    def __init__(self, chunks, decoder):
+        self._chunks = iter(chunks)
+        self._decoder = decoder
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        if self._eof:
+            return False
+        for chunk in self._chunks:
+            if chunk:
+                self._buf = self._buf[self._pos:] + chunk
+                self._pos = 0
+                return True
+        self._eof = True
+        return False
+
+    def peek(self):
+        while True:
+            buf, pos = self._buf, self._pos
+            while pos < len(buf) and buf[pos] in self._WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill():
+                return ''
+
+    def next_char(self):
+        c = self.peek()
+        if c:
+            self._pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                if self._fill():
+                    continue
+                raise
+            # A number cut by a chunk boundary still decodes ("12" of
+            # "1234", "-5" of "-5.5"), so it's only complete when followed
+            # by a delimiter.
+            if isinstance(obj, (int, float)) and \
+                    not isinstance(obj, bool) and \
+                    (end == len(self._buf) or
+                     self._buf[end] not in self._DELIMITERS) and \
+                    self._fill():
+                continue
+            self._pos = end
+            return obj
+
+
+def _iter_json_data(chunks, decoder):
+    """
+    Yield the elements of the top level "data" array of a JSON collection
+    one at a time, as they arrive. Other top level fields are skipped.
+    """
+    stream = _JsonStream(chunks, decoder)
+    if stream.next_char() != '{':
+        raise ValueError('Expected a JSON object')
+    while True:
+        c = stream.peek()
+        if c == '}' or c == '':
+            return
+        if c == ',':
+            stream.next_char()
+            continue
+        key = stream.value()
+        if stream.next_char() != ':':
+            raise ValueError('Expected ":" after ' + repr(key))
+        if key != 'data' or stream.peek() != '[':
+            stream.value()
+            continue
+        stream.next_char()
+        while True:
+            c = stream.peek()
+            if c == ']':
+                stream.next_char()
+                break
+            if c == ',':
+                stream.next_char()
+                continue
+            if c == '':
+                raise ValueError('Unterminated "data" array')
+            yield stream.value()
+
+
 class ApiError(Exception):
     def __init__(self, obj, status_code):
         if not obj:
@@ -204,9 +1487,19 @@ class ClientApiError(Exception):
     pass
 
 
+class CircuitOpenError(Exception):
+    def __init__(self, address):
+        super(CircuitOpenError, self).__init__(
+            'circuit open for {}: too many failed requests'.format(address))
+        self.address = address
+
+
 class GdapiClient(object):
     def __init__(self, access_key="", secret_key="", url=None, cache=False,
-                 cache_time=86400, strict=False, headers=HEADERS, **kw):
+                 cache_time=86400, strict=False, headers=HEADERS,
+                 transport=None, timeout=None, response_cache=None,
+                 metrics=None, retry_policy=None, coalescer=None,
+                 resources=None, **kw):
         self._headers = headers
         self._access_key = access_key
         self._secret_key = secret_key
@@ -216,12 +1509,27 @@ class GdapiClient(object):
         self._cache_time = cache_time
         self._strict = strict
         self.schema = None
-        self._session = requests.Session()
+        if transport is None:
+            transport = HttpTransport()
+        if RECORDING is not None:
+            transport = RecordingTransport(transport, RECORDING)
+        self._transport = transport
+        self._timeout = timeout
+        self.response_cache = response_cache
+        self.coalescer = coalescer
+        self.resources = None
+        if metrics is None:
+            metrics = METRICS
+        self.metrics = metrics
+        if retry_policy is None:
+            retry_policy = DEFAULT_RETRY_POLICY
+        self.retry_policy = retry_policy
 
         if not self._cache_time:
             self._cache_time = 60 * 60 * 24  # 24 Hours
 
         self._load_schemas()
+        self._use_resources(resources)
 
     def valid(self):
         return self._url is not None and self.schema is not None
@@ -231,134 +1539,236 @@ class GdapiClient(object):
             return [self.object_hook(x) for x in obj]
 
         if isinstance(obj, dict):
-            result = RestObject()
-
+            result = RestObject(self)
+            d = result.__dict__
             for k, v in six.iteritems(obj):
-                setattr(result, k, self.object_hook(v))
-
-            for link in ['next', 'prev']:
-                try:
-                    url = getattr(result.pagination, link)
-                    if url is not None:
-                        setattr(result, link, lambda url=url: self._get(url))
-                except AttributeError:
-                    pass
-
-            if hasattr(result, 'type') and isinstance(getattr(result, 'type'),
-                                                      six.string_types):
-                if hasattr(result, 'links'):
-                    for link_name, link in six.iteritems(result.links):
-                        def cb(_link=link, **kw):
-                            return self._get(_link, data=kw)
-                        if hasattr(result, link_name):
-                            setattr(result, link_name + '_link', cb)
-                        else:
-                            setattr(result, link_name, cb)
-
-                if hasattr(result, 'actions'):
-                    for link_name, link in six.iteritems(result.actions):
-                        def cb(_link_name=link_name,
-                               _result=result, *args, **kw):
-                            return self.action(_result, _link_name,
-                                               *args, **kw)
-                        if hasattr(result, link_name):
-                            setattr(result, link_name + '_action', cb)
-                        else:
-                            setattr(result, link_name, cb)
-
+                d[k] = self.object_hook(v)
             return result
 
         return obj
 
     def object_pairs_hook(self, pairs):
-        ret = collections.OrderedDict()
-        for k, v in pairs:
-            ret[k] = v
-        return self.object_hook(ret)
+        # The decoder calls this innermost-first, so nested values are
+        # already RestObjects and no further conversion is needed.
+        result = RestObject(self)
+        result.__dict__.update(pairs)
+        return result
 
     def _get(self, url, data=None):
-        return self._unmarshall(self._get_raw(url, data=data))
+        if self.coalescer is not None:
+            return self.coalescer.do(self.coalescer.key(url, data), url,
+                                     lambda: self._get_once(url, data))
+        return self._get_once(url, data)
+
+    def _get_once(self, url, data=None):
+        if self.response_cache is None:
+            return self._unmarshall(self._get_raw(url, data=data))
+        return self._get_cached(url, data=data)
+
+    def _get_cached(self, url, data=None):
+        cache = self.response_cache
+        key = cache.key(url, data)
+        entry = cache.get(key)
+        if entry is None:
+            r = self._get_response(url, data)
+        else:
+            etag, body, obj = entry
+            r = self._get_response(url, data, etag=etag)
+            if r.status_code == 304 or r.content == body:
+                cache.record(hit=True)
+                return obj
+
+        cache.record(hit=False)
+        obj = self._unmarshall(r.text)
+        cache.put(key, r.headers.get('ETag'), r.content, obj)
+        return obj
 
     def _error(self, text, status_code):
         raise ApiError(self._unmarshall(text), status_code)
 
-    @timed_url
+    def _request(self, method, url, headers=None, **kw):
+        if headers:
+            headers = dict(self._headers, **headers)
+        else:
+            headers = self._headers
+        policy = self.retry_policy
+        breaker = None
+        if policy.circuit_breaker:
+            breaker = get_circuit_breaker(self._breaker_address(url))
+        policy.started()
+        sent = kw.get('data') or b''
+        if isinstance(sent, six.text_type):
+            sent = sent.encode('utf-8')
+
+        attempt = 0
+        while True:
+            if breaker is not None:
+                breaker.before_request()
+            start = time.time()
+            try:
+                r = self._transport.request(method, url, auth=self._auth,
+                                            headers=headers,
+                                            timeout=self._timeout, **kw)
+            except requests.exceptions.RequestException as e:
+                if breaker is not None:
+                    breaker.record_failure()
+                reason = policy.classify(method, error=e)
+                if reason is None or \
+                        not policy.should_retry(attempt, reason):
+                    raise
+            else:
+                delta = time.time() - start
+                if TIME:
+                    print(delta, url, method)
+
+                if kw.get('stream'):
+                    received = int(r.headers.get('Content-Length', 0))
+                else:
+                    received = len(r.content)
+                self.metrics.record(method, url, delta, r.status_code,
+                                    bytes_sent=len(sent),
+                                    bytes_received=received)
+                if breaker is not None:
+                    if r.status_code in policy.retry_statuses:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                reason = policy.classify(method, response=r)
+                if reason is None or \
+                        not policy.should_retry(attempt, reason):
+                    return r
+                r.close()
+
+            self.metrics.record_retry(method, url)
+            time.sleep(policy.delay(attempt))
+            attempt += 1
+
+    def _breaker_address(self, url):
+        # A BalancedTransport fails over between its managers by itself,
+        # so an error only gets here once all of them failed; they share
+        # one breaker.
+        transport = self._transport
+        if isinstance(transport, RecordingTransport):
+            transport = transport.transport
+        if isinstance(transport, BalancedTransport):
+            return ','.join(sorted(transport.addresses))
+        return urlparse(url).netloc
+
     def _get_raw(self, url, data=None):
         r = self._get_response(url, data)
         return r.text
 
-    def _get_response(self, url, data=None):
-        r = self._session.get(url, auth=self._auth, params=data,
-                              headers=self._headers)
+    def _get_response(self, url, data=None, etag=None):
+        headers = None
+        if etag is not None:
+            headers = {'If-None-Match': etag}
+        r = self._request(GET_METHOD, url, params=data, headers=headers)
+        if etag is not None and r.status_code == 304:
+            return r
         if r.status_code < 200 or r.status_code >= 300:
             self._error(r.text, r.status_code)
 
         return r
 
-    @timed_url
     def _post(self, url, data=None):
-        r = self._session.post(url, auth=self._auth, data=self._marshall(data),
-                               headers=self._headers)
+        r = self._request(POST_METHOD, url, data=self._marshall(data))
         if r.status_code < 200 or r.status_code >= 300:
             self._error(r.text, r.status_code)
 
         return self._unmarshall(r.text)
 
-    @timed_url
     def _put(self, url, data=None):
-        r = self._session.put(url, auth=self._auth, data=self._marshall(data),
-                              headers=self._headers)
+        r = self._request(PUT_METHOD, url, data=self._marshall(data))
         if r.status_code < 200 or r.status_code >= 300:
             self._error(r.text, r.status_code)
 
         return self._unmarshall(r.text)
 
-    @timed_url
     def _delete(self, url):
-        r = self._session.delete(url, auth=self._auth, headers=self._headers)
+        r = self._request(DELETE_METHOD, url)
         if r.status_code < 200 or r.status_code >= 300:
             self._error(r.text, r.status_code)
 
         return self._unmarshall(r.text)
 
+    def _use_resources(self, module):
+        # A module generated for another schema would decode fields with
+        # the wrong types, so it is only used if the schema matches.
+        if module is not None and self.schema is not None and \
+                module.SCHEMA_FINGERPRINT == self.schema.fingerprint():
+            self.resources = module
+
     def _unmarshall(self, text):
         if text is None or text == '':
             return text
+        if self.resources is not None:
+            return decode_typed(self, json.loads(text),
+                                self.resources.CLASSES)
         obj = json.loads(text, object_hook=self.object_hook,
                          object_pairs_hook=self.object_pairs_hook)
         return obj
 
     def _marshall(self, obj, indent=None, sort_keys=False):
+        # Nested RestObjects are encoded directly by _json_default(), so
+        # the object tree is walked once and never copied.
         if obj is None:
             return None
-        return json.dumps(self._to_dict(obj), indent=indent, sort_keys=True)
+        return json.dumps(obj, default=_json_default, indent=indent,
+                          sort_keys=True)
 
-    def _load_schemas(self, force=False):
-        if self.schema and not force:
+    def _load_schemas(self, force=False, revalidate=False):
+        if self.schema and not force and not revalidate:
             return
 
-        schema_text = self._get_cached_schema()
-
-        if force or not schema_text:
-            response = self._get_response(self._url)
-            schema_url = response.headers.get('X-API-Schemas')
-            if schema_url is not None and self._url != schema_url:
-                schema_text = self._get_raw(schema_url)
-            else:
+        # A schema processed earlier by this process or stored in the
+        # on-disk cache is revalidated with one conditional GET of its URL
+        # and reused if the manager answers 304. Managers that send no ETag
+        # return the schema, which is then only decoded if its digest
+        # changed.
+        schema = None
+        response = None
+        known = None if force else self._get_known_schema()
+        if known is not None:
+            schema_url, digest, schema = known
+            etag = None
+            if digest.startswith('etag:'):
+                etag = digest[len('etag:'):]
+            response = self._get_response(schema_url, etag=etag)
+            if response.status_code == 304:
+                response = None
+            elif self._get_schema_digest(response) != digest:
+                schema = None
+
+        if schema is None:
+            if response is None:
+                response = self._get_response(self._url)
+                schema_url = response.headers.get('X-API-Schemas')
+                if schema_url is None or self._url == schema_url:
+                    schema_url = self._url
+                else:
+                    response = self._get_response(schema_url)
+            digest = self._get_schema_digest(response)
+            if not force:
+                schema = self._get_cached_schema(digest)
+            if schema is None:
                 schema_text = response.text
-            self._cache_schema(schema_text)
+                schema = Schema(schema_text, self._unmarshall(schema_text))
+            self._cache_schema(schema_url, digest, schema)
 
-        obj = self._unmarshall(schema_text)
-
-        schema = Schema(schema_text, obj)
-
-        if len(schema.types) > 0:
+        if len(schema.types) > 0 and schema is not self.schema:
             self._bind_methods(schema)
             self.schema = schema
 
     def reload_schema(self):
         self._load_schemas(force=True)
 
+    def revalidate_schema(self):
+        """
+        Check the schema with the manager in one conditional request and
+        reload it if it changed. Raises if the manager can't be reached.
+        """
+        self._load_schemas(revalidate=True)
+
     def by_id(self, type, id, **kw):
         id = str(id)
         url = self.schema.types[type].links.collection
@@ -374,6 +1784,14 @@ class GdapiClient(object):
             else:
                 raise e
 
+    def by_ids(self, type, ids, **kw):
+        # One list() call instead of a by_id() round trip per id. Ids that
+        # don't exist map to None, as by_id() returns None on 404.
+        index = {}
+        for obj in self.list(type, **kw):
+            index[obj.id] = obj
+        return dict((str(id), index.get(str(id))) for id in ids)
+
     def update_by_id(self, type, id, *args, **kw):
         url = self.schema.types[type].links.collection
         if url.endswith('/'):
@@ -389,31 +1807,31 @@ class GdapiClient(object):
 
     def _put_and_retry(self, url, *args, **kw):
         retries = kw.get('retries', 3)
-        last_error = None
+        policy = self.retry_policy
         for i in range(retries):
             try:
-                return self._put(url, data=self._to_dict(*args, **kw))
+                return self._put(url, data=self._to_payload(*args, **kw))
             except ApiError as e:
-                if e.error.code == 409:
-                    last_error = e
-                    time.sleep(.1)
-                else:
+                # Conflicts are always retried, outside the retry budget.
+                if e.error.code != 409 or i + 1 >= retries:
                     raise e
-        raise last_error
+                policy.count_retry('conflict')
+                self.metrics.record_retry(PUT_METHOD, url)
+                time.sleep(policy.delay(i))
 
     def _post_and_retry(self, url, *args, **kw):
         retries = kw.get('retries', 3)
-        last_error = None
+        policy = self.retry_policy
         for i in range(retries):
             try:
-                return self._post(url, data=self._to_dict(*args, **kw))
+                return self._post(url, data=self._to_payload(*args, **kw))
             except ApiError as e:
-                if e.error.code == 409:
-                    last_error = e
-                    time.sleep(.1)
-                else:
+                # Conflicts are always retried, outside the retry budget.
+                if e.error.code != 409 or i + 1 >= retries:
                     raise e
-        raise last_error
+                policy.count_retry('conflict')
+                self.metrics.record_retry(POST_METHOD, url)
+                time.sleep(policy.delay(i))
 
     def _validate_list(self, type, **kw):
         if not self._strict:
@@ -440,12 +1858,77 @@ class GdapiClient(object):
         collection_url = self.schema.types[type].links.collection
         return self._get(collection_url, data=self._to_dict(**kw))
 
+    def iter_list(self, type, **kw):
+        """
+        Like list(), but yield the collection's items one at a time while
+        the response is still being read. Stopping early closes the
+        response without reading the rest of it. Only the first page is
+        read; use iter_all() to follow pagination.
+        """
+        if type not in self.schema.types:
+            raise ClientApiError(type + ' is not a valid type')
+
+        self._validate_list(type, **kw)
+        collection_url = self.schema.types[type].links.collection
+        r = self._request(GET_METHOD, collection_url,
+                          params=self._to_dict(**kw), stream=True)
+        try:
+            if r.status_code < 200 or r.status_code >= 300:
+                self._error(r.text, r.status_code)
+
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            chunks = (decoder.decode(chunk) for chunk in
+                      r.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+            json_decoder = json.JSONDecoder(
+                object_pairs_hook=self.object_pairs_hook)
+            for obj in _iter_json_data(chunks, json_decoder):
+                yield obj
+        finally:
+            r.close()
+
+    def iter_all(self, type, prefetch=False, **kw):
+        """
+        Yield every item of a collection, following pagination "next"
+        links and fetching each page only when the previous one has been
+        consumed. With prefetch=True the next page is fetched in the
+        background while the current one is being iterated. At most two
+        pages are held at a time.
+        """
+        page = self.list(type, **kw)
+        executor = None
+        if prefetch:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        try:
+            while page is not None:
+                pagination = page.__dict__.get('pagination')
+                next_url = None
+                if isinstance(pagination, RestObject):
+                    next_url = pagination.__dict__.get('next')
+
+                future = None
+                if executor is not None and next_url:
+                    future = executor.submit(self._get, next_url)
+
+                for item in page:
+                    yield item
+
+                if future is not None:
+                    page = future.result()
+                elif next_url:
+                    page = self._get(next_url)
+                else:
+                    page = None
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
     def reload(self, obj):
         return self.by_id(obj.type, obj.id)
 
     def create(self, type, *args, **kw):
         collection_url = self.schema.types[type].links.collection
-        return self._post(collection_url, data=self._to_dict(*args, **kw))
+        return self._post(collection_url,
+                          data=self._to_payload(*args, **kw))
 
     def delete(self, *args):
         for i in args:
@@ -511,6 +1994,22 @@ class GdapiClient(object):
 
         return ret
 
+    def _to_payload(self, *args, **kw):
+        # Request body for _post()/_put(): the same fields as _to_dict(),
+        # but only the top level is merged. Nested values are left as they
+        # are for _marshall() to encode.
+        if len(kw) == 0 and len(args) == 1 and self._is_list(args[0]):
+            return args[0]
+
+        ret = {}
+        for i in args:
+            if isinstance(i, RestObject):
+                ret.update(_public_fields(i))
+            elif isinstance(i, dict):
+                ret.update(i)
+        ret.update(kw)
+        return ret
+
     @staticmethod
     def _type_name_variants(name):
         ret = [name]
@@ -521,32 +2020,24 @@ class GdapiClient(object):
         return ret
 
     def _bind_methods(self, schema):
-        bindings = [
-            ('list', 'collectionMethods', GET_METHOD, self.list),
-            ('by_id', 'collectionMethods', GET_METHOD, self.by_id),
-            ('update_by_id', 'resourceMethods', PUT_METHOD, self.update_by_id),
-            ('create', 'collectionMethods', POST_METHOD, self.create)
-        ]
-
-        for type_name, typ in six.iteritems(schema.types):
-            for name_variant in self._type_name_variants(type_name):
-                for method_name, type_collection, test_method, m in bindings:
-                    # double lambda for lexical binding hack, I'm sure there's
-                    # a better way to do this
-                    def cb(type_name=type_name, method=m):
-                        return lambda *args, **kw: \
-                            method(type_name, *args, **kw)
-                    if test_method in getattr(typ, type_collection, []):
-                        setattr(self, '_'.join([method_name, name_variant]),
-                                cb())
+        for attr, method_name, type_name in schema.bindings:
+            setattr(self, attr,
+                    functools.partial(getattr(self, method_name), type_name))
 
     def _get_schema_hash(self):
         h = hashlib.new('sha1')
-        h.update(self._url)
+        h.update(self._url.encode('utf-8'))
         if self._access_key is not None:
-            h.update(self._access_key)
+            h.update(self._access_key.encode('utf-8'))
         return h.hexdigest()
 
+    @staticmethod
+    def _get_schema_digest(response):
+        etag = response.headers.get('ETag')
+        if etag:
+            return 'etag:' + etag
+        return 'sha1:' + hashlib.sha1(response.content).hexdigest()
+
     def _get_cached_schema_file_name(self):
         if not self._cache:
             return None
@@ -562,39 +2053,180 @@ class GdapiClient(object):
 
         return os.path.join(cachedir, 'schema-' + h + '.json')
 
-    def _cache_schema(self, text):
+    def _cache_schema(self, schema_url, digest, schema):
+        h = self._get_schema_hash()
+        _schemas[(h, digest)] = schema
+        _schema_urls[h] = (schema_url, digest)
+
         cached_schema = self._get_cached_schema_file_name()
 
         if not cached_schema:
             return None
 
-        with open(cached_schema, 'w') as f:
-            f.write(text)
+        # Only the schema text is stored; it is decoded again by the first
+        # client of each process that reads it.
+        data = {
+            'version': SCHEMA_CACHE_VERSION,
+            'schema_url': schema_url,
+            'digest': digest,
+            'schema': schema.text,
+        }
+        tmp = cached_schema + '.' + str(os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp, cached_schema)
+
+    def _get_cached_schema(self, digest):
+        key = (self._get_schema_hash(), digest)
+        schema = _schemas.get(key)
+        if schema is not None:
+            return schema
+
+        data = self._read_cached_schema()
+        if data is None or data['digest'] != digest:
+            return None
+
+        schema = data['schema']
+        _schemas[key] = schema
+        return schema
+
+    def _get_known_schema(self):
+        """
+        Return (schema url, digest, schema) of the last schema processed
+        for this client's URL, or None.
+        """
+        h = self._get_schema_hash()
+        known = _schema_urls.get(h)
+        if known is not None:
+            schema = _schemas.get((h,) + known[1:])
+            if schema is not None:
+                return known + (schema,)
+
+        data = self._read_cached_schema()
+        if data is None:
+            return None
+        _schemas[(h, data['digest'])] = data['schema']
+        _schema_urls[h] = (data['schema_url'], data['digest'])
+        return data['schema_url'], data['digest'], data['schema']
 
-    def _get_cached_schema(self):
+    def _read_cached_schema(self):
         if not self._cache:
             return None
 
         cached_schema = self._get_cached_schema_file_name()
 
-        if not cached_schema:
+        if not cached_schema or not os.path.exists(cached_schema):
             return None
 
-        if os.path.exists(cached_schema):
-            mod_time = os.path.getmtime(cached_schema)
-            if time.time() - mod_time < self._cache_time:
-                with open(cached_schema) as f:
-                    data = f.read()
-                return data
+        mod_time = os.path.getmtime(cached_schema)
+        if time.time() - mod_time >= self._cache_time:
+            return None
 
-        return None
+        try:
+            with open(cached_schema) as f:
+                data = json.load(f)
+            if data.get('version') != SCHEMA_CACHE_VERSION:
+                return None
+            text = data['schema']
+            data['schema'] = Schema(text, self._unmarshall(text))
+        except Exception:
+            return None
+        return data
+
+
+# Processed schemas shared by every client in this process, keyed by
+# (client url hash, schema digest).
+_schemas = {}
+
+# (schema url, digest) of the last schema processed per client url hash.
+_schema_urls = {}
+
+
+class AsyncClient(object):
+    """
+    asyncio front end for a GdapiClient.
+
+    The same schema-driven bindings as the synchronous client are created
+    (list_volume, by_id_node, create_volume, update_by_id_setting, ...),
+    but every call returns a coroutine. requests is blocking, so each call
+    runs on a worker thread over the wrapped client's pooled transport;
+    at most concurrency calls are in flight at once, however many
+    coroutines are awaited together.
+
+    Objects returned are ordinary RestObjects. Their action and link
+    callbacks stay synchronous; use action() to run an action from a
+    coroutine.
+
+    This is deliberately not a native asyncio HTTP client: running the
+    synchronous client on a thread pool keeps retries, metrics, recording
+    and the shared transport exactly as they are, without another HTTP
+    dependency. scripts/check_async_client.py checks it against the fake
+    manager.
+    """
+    def __init__(self, client, concurrency=DEFAULT_POOL_SIZE):
+        self.client = client
+        self.schema = client.schema
+        self._concurrency = concurrency
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=concurrency)
+        self._loop = None
+        self._semaphore = None
+        self._bind_methods(self.schema)
+
+    _type_name_variants = staticmethod(GdapiClient._type_name_variants)
+    _bind_methods = GdapiClient._bind_methods
+
+    async def _call(self, fn, *args, **kw):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        async with self._semaphore:
+            return await loop.run_in_executor(
+                self._executor, functools.partial(fn, *args, **kw))
+
+    def list(self, type, **kw):
+        return self._call(self.client.list, type, **kw)
+
+    def by_id(self, type, id, **kw):
+        return self._call(self.client.by_id, type, id, **kw)
+
+    def by_ids(self, type, ids, **kw):
+        return self._call(self.client.by_ids, type, ids, **kw)
+
+    def update_by_id(self, type, id, *args, **kw):
+        return self._call(self.client.update_by_id, type, id, *args, **kw)
+
+    def create(self, type, *args, **kw):
+        return self._call(self.client.create, type, *args, **kw)
+
+    def update(self, obj, *args, **kw):
+        return self._call(self.client.update, obj, *args, **kw)
+
+    def delete(self, *args):
+        return self._call(self.client.delete, *args)
+
+    def reload(self, obj):
+        return self._call(self.client.reload, obj)
+
+    def action(self, obj, action_name, *args, **kw):
+        return self._call(self.client.action, obj, action_name, *args, **kw)
+
+    @staticmethod
+    def gather(*aws):
+        return asyncio.gather(*aws)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
 
 
 def _print_cli(client, obj):
     if obj is None:
         return
 
-    if JSON:
+    if FORMAT in ROW_FORMATS:
+        _RowPrinter(FORMAT, FIELDS).write(obj)
+    elif JSON:
         print(client._marshall(obj, indent=2, sort_keys=True))
     elif callable(getattr(obj, '_as_table')):
         print(obj._as_table())
@@ -602,6 +2234,65 @@ def _print_cli(client, obj):
         print(obj)
 
 
+def _project(obj, fields):
+    # Pick fields out of a resource; 'a.b' looks up b in the value of a.
+    row = collections.OrderedDict()
+    for field in fields:
+        value = obj
+        for name in field.split('.'):
+            if isinstance(value, RestObject):
+                value = value.__dict__.get(name)
+            elif isinstance(value, dict):
+                value = value.get(name)
+            else:
+                value = None
+        row[field] = value
+    return row
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (RestObject, dict, list)):
+        return json.dumps(value, default=_json_default, sort_keys=True)
+    return value
+
+
+class _RowPrinter(object):
+    """
+    Prints resources one line each as they are produced, for
+    --format jsonl and csv, so a listing never has to be held in memory.
+    Without fields, jsonl prints whole resources and csv takes its
+    columns from the first resource, leaving out links and actions.
+    """
+    def __init__(self, format, fields=None, out=None):
+        self.format = format
+        self.fields = fields
+        if out is None:
+            import sys
+            out = sys.stdout
+        self.out = out
+        self._csv = None
+
+    def write(self, obj):
+        if self.format == 'jsonl':
+            if self.fields is not None:
+                obj = _project(obj, self.fields)
+            self.out.write(json.dumps(obj, default=_json_default) + '\n')
+            return
+
+        if self._csv is None:
+            if self.fields is None:
+                self.fields = [k for k in _public_fields(obj)
+                               if k not in ('links', 'actions')]
+            self._csv = csv.writer(self.out, lineterminator='\n')
+            self._csv.writerow(self.fields)
+        row = _project(obj, self.fields)
+        self._csv.writerow([_csv_value(v) for v in row.values()])
+
+
 def indent(rows, hasHeader=False, headerChar='-', delim=' | ', justify='left',
            separateRows=False, prefix='', postfix='', wrapfunc=lambda x: x):
     '''Indents a table by column.
@@ -621,11 +2312,11 @@ def indent(rows, hasHeader=False, headerChar='-', delim=' | ', justify='left',
     # closure for breaking logical rows to physical, using wrapfunc
     def rowWrapper(row):
         newRows = [wrapfunc(item).split('\n') for item in row]
-        return [[substr or '' for substr in item] for item in map(None, *newRows)]  # NOQA
+        return [[substr or '' for substr in item] for item in zip_longest(*newRows)]  # NOQA
     # break each logical row into one or more physical ones
     logicalRows = [rowWrapper(row) for row in rows]
     # columns of physical rows
-    columns = map(None, *reduce(operator.add, logicalRows))
+    columns = zip_longest(*reduce(operator.add, logicalRows))
     # get the maximum of each column by the string length of its items
     maxWidths = [max([len(str(item)) for item in column])
                  for column in columns]
@@ -690,7 +2381,10 @@ def _general_args(help=True):
     parser.add_argument('--secret-key', dest='_secret_key')
     parser.add_argument('--url', dest='_url')
     parser.add_argument('--format', dest='_format', default='table',
-                        choices=['table', 'json'])
+                        choices=['table', 'json', 'jsonl', 'csv'])
+    parser.add_argument('--fields', dest='_fields',
+                        help='comma separated fields to print with '
+                             '--format jsonl or csv, e.g. name,state')
     parser.add_argument('--cache', dest='_cache', action='store_true',
                         default=True)
     parser.add_argument('--no-cache', dest='_cache', action='store_false')
@@ -753,48 +2447,68 @@ def _generic_args(subparsers, field_key, type, schema,
     return subparser
 
 
-def _full_args(client):
-    parser = _general_args()
-    subparsers = parser.add_subparsers(help='Sub-Command Help')
-    for type, schema in six.iteritems(client.schema.types):
-        if schema.listable:
-            subparser = _list_args(subparsers, client, type, schema)
-            subparser.set_defaults(_action=LIST, _type=type)
-        if schema.creatable:
-            subparser = _generic_args(subparsers, 'create', type,
-                                      schema.resourceFields, operation=CREATE)
-            subparser.set_defaults(_action=CREATE, _type=type)
-        if schema.updatable:
-            subparser = _generic_args(subparsers, 'update', type,
-                                      schema.resourceFields, operation=UPDATE)
-            subparser.add_argument('--id')
-            subparser.set_defaults(_action=UPDATE, _type=type)
-        if schema.deletable:
-            subparser = _generic_args(subparsers, 'delete', type,
-                                      {}, operation=DELETE)
-            subparser.add_argument('--id')
-            subparser.set_defaults(_action=DELETE, _type=type)
-
+def _command_args(subparsers, client, command, operation, type):
+    schema = client.schema.types[type]
+    if operation == LIST:
+        subparser = _list_args(subparsers, client, type, schema)
+    elif operation in (CREATE, UPDATE):
+        field_key = operation[0:len(operation)-1]
+        subparser = _generic_args(subparsers, field_key, type,
+                                  schema.resourceFields, operation=operation)
+    elif operation == DELETE:
+        subparser = _generic_args(subparsers, 'delete', type,
+                                  {}, operation=DELETE)
+    else:
+        name = operation[len(ACTION):]
+        resource_fields = None
         try:
-            for name, args in six.iteritems(schema.resourceActions):
-                action_schema = None
-                try:
-                    action_schema = client.schema.types[args.input]
-                except (KeyError, AttributeError):
-                    pass
-                help_msg = 'Action ' + name + ' on ' + type
-                resource_fields = None
-                if action_schema is not None:
-                    resource_fields = action_schema.resourceFields
-                subparser = _generic_args(subparsers, 'create', type,
-                                          resource_fields,
-                                          operation_name=type + '-' + name,
-                                          help=help_msg)
-                subparser.add_argument('--id')
-                subparser.set_defaults(_action=ACTION + name, _type=type)
-
+            input = getattr(schema.resourceActions, name).input
+            resource_fields = client.schema.types[input].resourceFields
         except (KeyError, AttributeError):
             pass
+        subparser = _generic_args(subparsers, 'create', type,
+                                  resource_fields, operation_name=command,
+                                  help='Action ' + name + ' on ' + type)
+
+    if operation != LIST and operation != CREATE:
+        subparser.add_argument('--id')
+    subparser.set_defaults(_action=operation, _type=type)
+    return subparser
+
+
+def _invoked_command(client, argv):
+    if 'argcomplete' in globals() and '_ARGCOMPLETE' in os.environ:
+        # Only a command that has been typed in full counts.
+        line = os.environ.get('COMP_LINE', '')
+        argv = line.split()
+        if not line.endswith(' '):
+            argv = argv[:-1]
+    rest = argv[len(_get_generic_vars(argv)):]
+    if rest and rest[0] in set(c[0] for c in client.schema.commands):
+        return rest[0]
+    return None
+
+
+def _full_args(client, argv=None):
+    """
+    Build the CLI parser. With argv, only the sub-command it invokes is
+    built. If it doesn't invoke one, every command is added without its
+    arguments, which is all --help and command name completion need.
+    Without argv, every command is built in full.
+    """
+    parser = _general_args()
+    subparsers = parser.add_subparsers(help='Sub-Command Help')
+    invoked = None
+    if argv is not None:
+        invoked = _invoked_command(client, argv)
+
+    for command, operation, type, help_msg in client.schema.commands:
+        if argv is None:
+            _command_args(subparsers, client, command, operation, type)
+        elif invoked is None:
+            subparsers.add_parser(command, help=help_msg)
+        elif command == invoked:
+            _command_args(subparsers, client, command, operation, type)
 
     if 'argcomplete' in globals():
         argcomplete.autocomplete(parser)
@@ -809,6 +2523,11 @@ def _run_cli(client, namespace):
         if command_type == LIST:
             if 'id' in args:
                 _print_cli(client, client.by_id(type_name, args['id']))
+            elif FORMAT in ROW_FORMATS:
+                # Rows are printed while later pages are still fetched.
+                printer = _RowPrinter(FORMAT, FIELDS)
+                for i in client.iter_all(type_name, **args):
+                    printer.write(i)
             else:
                 result = client.list(type_name, **args)
                 if JSON:
@@ -889,6 +2608,13 @@ def _cli_client(argv):
     if args._format == 'json':
         JSON = True
 
+    global FORMAT
+    FORMAT = args._format
+
+    global FIELDS
+    if args._fields:
+        FIELDS = [f.strip() for f in args._fields.split(',') if f.strip()]
+
     dict_args = {}
     for k, v in vars(args).items():
         dict_args[k[1:]] = v
@@ -936,3 +2662,15 @@ def _get_timeout(timeout):
 
 def from_env(prefix='CATTLE_', **kw):
     return gdapi_from_env(prefix=prefix, factory=Client, **kw)
+
+
+def _main():
+    import sys
+
+    client = _cli_client(sys.argv)
+    args = _full_args(client, sys.argv).parse_args()
+    _run_cli(client, args)
+
+
+if __name__ == '__main__':
+    _main()
@@ -49,6 +49,9 @@ from common import wait_for_rebuild_complete
 from common import wait_for_volume_expansion
 from common import fail_replica_expansion, wait_for_expansion_failure
 from common import VOLUME_FRONTEND_BLOCKDEV, VOLUME_FRONTEND_ISCSI
+from common import VOLUME_FIELD_STATE, VOLUME_STATE_ATTACHED
+from common import VOLUME_FIELD_ROBUSTNESS, VOLUME_ROBUSTNESS_HEALTHY
+from common import VOLUME_FIELD_INITIALRESTORATIONREQUIRED
 
 
 @pytest.mark.coretest   # NOQA
@@ -706,26 +709,16 @@ def restore_inc_test(client, core_api, volume_name, pod):  # NOQA
     common.wait_for_volume_restoration_completed(client, sb_volume1_name)
     common.wait_for_volume_restoration_completed(client, sb_volume2_name)
 
-    sb_volume0 = common.wait_for_volume_healthy_no_frontend(client,
-                                                            sb_volume0_name)
-    sb_volume1 = common.wait_for_volume_healthy_no_frontend(client,
-                                                            sb_volume1_name)
-    sb_volume2 = common.wait_for_volume_healthy_no_frontend(client,
-                                                            sb_volume2_name)
+    sb_volume_names = [sb_volume0_name, sb_volume1_name, sb_volume2_name]
+    common.wait_for_volumes_status(client, sb_volume_names,
+                                   VOLUME_FIELD_STATE, VOLUME_STATE_ATTACHED)
+    common.wait_for_volumes_status(client, sb_volume_names,
+                                   VOLUME_FIELD_ROBUSTNESS,
+                                   VOLUME_ROBUSTNESS_HEALTHY)
+    sb_volume0, sb_volume1, sb_volume2 = common.wait_for_volumes_status(
+        client, sb_volume_names,
+        VOLUME_FIELD_INITIALRESTORATIONREQUIRED, False)
 
-    for i in range(RETRY_COUNTS):
-        sb_volume0 = client.by_id_volume(sb_volume0_name)
-        sb_volume1 = client.by_id_volume(sb_volume1_name)
-        sb_volume2 = client.by_id_volume(sb_volume2_name)
-        sb_engine0 = get_volume_engine(sb_volume0)
-        sb_engine1 = get_volume_engine(sb_volume1)
-        sb_engine2 = get_volume_engine(sb_volume2)
-        if sb_volume0.initialRestorationRequired is True or \
-           sb_volume1.initialRestorationRequired is True or \
-           sb_volume2.initialRestorationRequired is True:
-            time.sleep(RETRY_INTERVAL)
-        else:
-            break
     assert sb_volume0.standby is True
     assert sb_volume0.lastBackup == backup0.name
     assert sb_volume0.frontend == ""
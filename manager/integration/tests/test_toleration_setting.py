@@ -82,7 +82,7 @@ def test_toleration_setting():
     assert setting.value == setting_value_str
     wait_for_toleration_update(core_api, apps_api, count, setting_value_dict)
 
-    client = get_longhorn_api_client()
+    client = get_longhorn_api_client(fresh=True)
 
     ei = get_default_engine_image(client)
     ei_name = ei["name"]
@@ -109,7 +109,7 @@ def test_toleration_setting():
     assert setting.value == setting_value_str
     wait_for_toleration_update(core_api, apps_api, count, setting_value_dict)
 
-    client = get_longhorn_api_client()
+    client = get_longhorn_api_client(fresh=True)
 
     ei = get_default_engine_image(client)
     ei_name = ei["name"]
@@ -176,7 +176,7 @@ def wait_for_toleration_update(core_api, apps_api, count, set_tolerations):  # N
         if not updated:
             continue
 
-        client = get_longhorn_api_client()
+        client = get_longhorn_api_client(fresh=True)
         images = client.list_engine_image()
         assert len(images) == 1
         if images[0].state != "ready":
@@ -60,7 +60,7 @@ def test_upgrade(upgrade_image_tag, volume_name):  # NOQA
 
     assert longhorn_upgrade(upgrade_image_tag)
 
-    client = get_longhorn_api_client()
+    client = get_longhorn_api_client(fresh=True)
 
     volume = client.by_id_volume(volume_name)
 
@@ -103,11 +103,15 @@ def wait_longhorn_node_zone_updated(client): # NOQA
 def get_zone_replica_count(client, volume_name, zone_name): # NOQA
     volume = client.by_id_volume(volume_name)
 
+    # Replicas not scheduled yet have no hostId.
+    hosts = [r.hostId for r in volume.replicas if r.hostId]
+    nodes = client.by_ids_node(hosts)
+
     zone_replica_count = 0
-    for replica in volume.replicas:
-        replica_host_id = replica.hostId
-        replica_host_zone = client.by_id_node(replica_host_id).zone
-        if replica_host_zone == zone_name:
+    for host in hosts:
+        assert nodes[host] is not None, \
+            "replica of %s on unknown node %s" % (volume_name, host)
+        if nodes[host].zone == zone_name:
             zone_replica_count += 1
     return zone_replica_count
 
@@ -0,0 +1,347 @@
+"""
+pytest plugin attributing each test's wall time to what it waited on.
+
+conftest.py registers it with --wait-profile <file>. While it is active
+these are timed:
+
+  wait            common.wait_* and common.wait_for_* helpers
+  create_and_wait common.create_and_wait_* helpers
+  delete_and_wait common.delete_and_wait_* helpers
+  exec            Kubernetes stream() exec calls
+  api             Longhorn API requests
+
+A call made inside another timed call counts towards the outer call's
+category only, so per test the categories add up to at most its wall
+time; the rest is reported as "other". Polls made by common's waiters
+count towards the innermost timed helper they were made in, not counting
+the generic waiters in GENERIC_HELPERS unless nothing else is running.
+
+At the end of the session a report sorted by time is printed and written
+as JSON to the given file. Two such files are compared with
+
+  python wait_profiler.py old.json new.json
+
+which lists the tests, categories and helpers that got slower and exits
+with 1 if there are any. --wait-profile-baseline does the same at the end
+of the session.
+"""
+
+from __future__ import print_function
+
+import argparse
+import functools
+import inspect
+import json
+import sys
+import threading
+import time
+
+import kubernetes.stream
+import pytest
+
+import common
+import longhorn
+
+PROFILE_VERSION = 1
+
+CATEGORIES = ('wait', 'create_and_wait', 'delete_and_wait', 'exec', 'api')
+
+# A regression is at least this much slower, relatively and in seconds.
+DEFAULT_THRESHOLD = 0.2
+DEFAULT_MIN_SECONDS = 1.0
+
+SESSION = '<session>'
+
+# Waiters every helper builds on; polls go to the helper calling them.
+GENERIC_HELPERS = frozenset(['wait_until', 'wait_for_tracked',
+                             'wait_for_k8s_object'])
+
+
+def _category(name):
+    if name.startswith('create_and_wait_'):
+        return 'create_and_wait'
+    if name.startswith('delete_and_wait_'):
+        return 'delete_and_wait'
+    if name.startswith('wait_'):
+        return 'wait'
+    return None
+
+
+def _new_record():
+    return {
+        'seconds': 0.0,
+        'categories': dict((c, 0.0) for c in CATEGORIES),
+        'calls': {},
+        'api_calls': 0,
+        'polls': 0,
+    }
+
+
+class WaitProfiler(object):
+
+    def __init__(self, path=None, baseline=None,
+                 threshold=DEFAULT_THRESHOLD,
+                 min_seconds=DEFAULT_MIN_SECONDS):
+        self.path = path
+        self.baseline = baseline
+        self.threshold = threshold
+        self.min_seconds = min_seconds
+        self.tests = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._current = SESSION
+        self._patched = []
+        self.tests[SESSION] = _new_record()
+
+    # Patching
+
+    def install(self):
+        for name, fn in list(vars(common).items()):
+            category = _category(name)
+            if category is None or not inspect.isfunction(fn) or \
+                    fn.__module__ != common.__name__:
+                continue
+            self._patch(common, name, self._wrap(fn, category, name))
+
+        wrapped = self._wrap(kubernetes.stream.stream, 'exec', 'stream')
+        self._patch(kubernetes.stream, 'stream', wrapped)
+        self._patch(common, 'stream', wrapped)
+
+        self._patch(longhorn.GdapiClient, '_request',
+                    self._wrap(longhorn.GdapiClient._request, 'api',
+                               'longhorn_api'))
+
+        record_wait = common._record_wait
+
+        def _record_wait(name, polls, waited, timed_out):
+            record_wait(name, polls, waited, timed_out)
+            self._record_polls(polls)
+        self._patch(common, '_record_wait', _record_wait)
+
+    def uninstall(self):
+        for obj, name, original in reversed(self._patched):
+            setattr(obj, name, original)
+        self._patched = []
+
+    def _patch(self, obj, name, value):
+        self._patched.append((obj, name, getattr(obj, name)))
+        setattr(obj, name, value)
+
+    def _wrap(self, fn, category, label):
+        profiler = self
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kw):
+            stack = profiler._stack()
+            stack.append(label)
+            start = time.monotonic()
+            try:
+                return fn(*args, **kw)
+            finally:
+                stack.pop()
+                profiler._record(category, label, time.monotonic() - start,
+                                 not stack)
+        return wrapper
+
+    def _stack(self):
+        # Labels of the timed calls running on this thread, outermost
+        # first.
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, category, label, seconds, outermost):
+        # Worker threads (cleanup pools, the cluster state tracker) only
+        # add to call counts; their time is inside a main thread call.
+        main = threading.current_thread() is threading.main_thread()
+        with self._lock:
+            record = self.tests[self._current]
+            if category == 'api':
+                record['api_calls'] += 1
+            if not main:
+                return
+            calls = record['calls'].setdefault(
+                label, {'calls': 0, 'seconds': 0.0, 'polls': 0})
+            calls['calls'] += 1
+            calls['seconds'] += seconds
+            if outermost:
+                record['categories'][category] += seconds
+
+    def _record_polls(self, polls):
+        stack = self._stack()
+        label = None
+        for label in reversed(stack):
+            if label not in GENERIC_HELPERS:
+                break
+        main = threading.current_thread() is threading.main_thread()
+        with self._lock:
+            record = self.tests[self._current]
+            record['polls'] += polls
+            if main and label is not None:
+                calls = record['calls'].setdefault(
+                    label, {'calls': 0, 'seconds': 0.0, 'polls': 0})
+                calls['polls'] += polls
+
+    # Hooks
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        with self._lock:
+            self._current = item.nodeid
+            self.tests[item.nodeid] = _new_record()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.tests[item.nodeid]['seconds'] = \
+                    time.monotonic() - start
+                self._current = SESSION
+
+    def pytest_terminal_summary(self, terminalreporter):
+        report = self.report()
+        write = terminalreporter.write_line
+        terminalreporter.write_sep("-", "wait profile")
+        for line in format_report(report):
+            write(line)
+
+        if self.path:
+            with open(self.path, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            write("wait profile written to %s" % self.path)
+
+        if self.baseline:
+            with open(self.baseline) as f:
+                old = json.load(f)
+            regressions = compare(old, report, self.threshold,
+                                  self.min_seconds)
+            terminalreporter.write_sep("-", "wait profile regressions")
+            for line in format_regressions(regressions):
+                write(line)
+
+    def report(self):
+        tests = {}
+        for nodeid, record in self.tests.items():
+            if nodeid == SESSION and not record['calls']:
+                continue
+            record = dict(record)
+            record['categories'] = dict(record['categories'])
+            record['categories']['other'] = max(
+                0.0, record['seconds'] - sum(record['categories'].values()))
+            tests[nodeid] = record
+
+        totals = _new_record()
+        totals['categories']['other'] = 0.0
+        for record in tests.values():
+            _add(totals, record)
+        return {'version': PROFILE_VERSION, 'tests': tests,
+                'totals': totals}
+
+
+def _add(totals, record):
+    totals['seconds'] += record['seconds']
+    totals['api_calls'] += record['api_calls']
+    totals['polls'] += record['polls']
+    for category, seconds in record['categories'].items():
+        totals['categories'][category] = \
+            totals['categories'].get(category, 0.0) + seconds
+    for label, calls in record['calls'].items():
+        total = totals['calls'].setdefault(
+            label, {'calls': 0, 'seconds': 0.0, 'polls': 0})
+        for k in total:
+            total[k] += calls[k]
+
+
+def format_report(report, top=20):
+    totals = report['totals']
+    lines = ["%d tests, %.1fs, %d Longhorn API calls, %d polls" % (
+        len(report['tests']), totals['seconds'], totals['api_calls'],
+        totals['polls'])]
+    for category, seconds in sorted(totals['categories'].items(),
+                                    key=lambda kv: -kv[1]):
+        lines.append("  %-16s %9.1fs" % (category, seconds))
+
+    lines.append("slowest helpers:")
+    calls = sorted(totals['calls'].items(), key=lambda kv: -kv[1]['seconds'])
+    for label, c in calls[:top]:
+        lines.append("  %-40s %9.1fs %6d calls %7d polls" % (
+            label, c['seconds'], c['calls'], c['polls']))
+
+    lines.append("slowest tests:")
+    tests = sorted(report['tests'].items(), key=lambda kv: -kv[1]['seconds'])
+    for nodeid, record in tests[:top]:
+        waited = sorted(record['categories'].items(), key=lambda kv: -kv[1])
+        lines.append("  %9.1fs %s (%s)" % (
+            record['seconds'], nodeid,
+            ", ".join("%s %.1fs" % kv for kv in waited if kv[1] >= 0.1)))
+    return lines
+
+
+def compare(old, new, threshold=DEFAULT_THRESHOLD,
+            min_seconds=DEFAULT_MIN_SECONDS):
+    """
+    Return (what, old seconds, new seconds) for every test, category of a
+    test, and helper total that is slower in new by more than threshold
+    (relative) and min_seconds, slowest increase first.
+    """
+    def slower(a, b):
+        return b - a >= min_seconds and b > a * (1 + threshold)
+
+    regressions = []
+    for nodeid, record in new['tests'].items():
+        before = old['tests'].get(nodeid)
+        if before is None:
+            continue
+        if slower(before['seconds'], record['seconds']):
+            regressions.append((nodeid, before['seconds'],
+                                record['seconds']))
+        for category, seconds in record['categories'].items():
+            was = before['categories'].get(category, 0.0)
+            if slower(was, seconds):
+                regressions.append(("%s [%s]" % (nodeid, category), was,
+                                    seconds))
+
+    old_calls = old['totals']['calls']
+    for label, calls in new['totals']['calls'].items():
+        was = old_calls.get(label, {}).get('seconds', 0.0)
+        if label in old_calls and slower(was, calls['seconds']):
+            regressions.append(("helper %s" % label, was, calls['seconds']))
+
+    regressions.sort(key=lambda r: r[1] - r[2])
+    return regressions
+
+
+def format_regressions(regressions):
+    if not regressions:
+        return ["no regressions"]
+    return ["%+8.1fs %8.1fs -> %8.1fs  %s" % (b - a, a, b, what)
+            for what, a, b in regressions]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare two wait profiles and list regressions.")
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown to report (default: "
+                             "%(default)s)")
+    parser.add_argument('--min-seconds', type=float,
+                        default=DEFAULT_MIN_SECONDS,
+                        help="absolute slowdown to report (default: "
+                             "%(default)s)")
+    args = parser.parse_args(argv)
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressions = compare(old, new, args.threshold, args.min_seconds)
+    for line in format_regressions(regressions):
+        print(line)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())